@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SHOPLIFT.settings')
+# Serve the async views, e.g. registration hashes passwords off the event loop
+os.environ.setdefault('ASYNC_VIEWS', '1')
+# Share a bounded pool of database connections between the request threads
+os.environ.setdefault('DATABASE_POOL', '1')
 
 application = get_asgi_application()
@@ -0,0 +1,238 @@
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from SHOPLIFT.routers import RequestRouting, current_routing, stick_to_primary
+
+
+logger = logging.getLogger('shoplift.requests')
+
+# Metrics of the request being served. Async views run their queries in another thread,
+# the context variable follows them there while a per-connection wrapper would not.
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.connections = 0
+        self.view_started = None
+        self.view_db_time = 0.0
+        self.view_time = 0.0
+        self.render_started = None
+        self.render_time = 0.0
+
+    # Connection execute wrapper, times every query sent to any database
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    def start_view(self):
+        self.view_started = time.perf_counter()
+        self.view_db_time = self.db_time
+
+    def start_render(self):
+        if self.view_started is not None:
+            # Time spent in the view outside the database, mostly serializer work
+            self.view_time = time.perf_counter() - self.view_started - (self.db_time - self.view_db_time)
+        self.render_started = time.perf_counter()
+
+    def finish_render(self, response):
+        self.render_time = time.perf_counter() - self.render_started
+
+
+# Connection execute wrapper installed once per connection, times queries for the current request
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# Counts the connections opened, or taken from the pool, while serving the current request
+def count_connection(connection, **kwargs):
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.connections += 1
+
+
+connection_created.connect(install_query_recorder, dispatch_uid='shoplift-request-metrics')
+connection_created.connect(count_connection, dispatch_uid='shoplift-connection-metrics')
+
+
+# Size, idle connections and waiting requests of the default database's pool, None without DATABASE_POOL
+def pool_stats():
+    pool = getattr(connections['default'], 'pool', None)
+    if pool is None:
+        return None
+    stats = pool.get_stats()
+    return {
+        'size': stats.get('pool_size', 0),
+        'available': stats.get('pool_available', 0),
+        'waiting': stats.get('requests_waiting', 0),
+    }
+
+
+class RequestMetricsMiddleware:
+
+    # Records query count, DB time, view time, render time and total latency per URL name
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        # Connections opened before this module was imported missed connection_created
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+        metrics, token, started = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics, token, started = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    def start(self, request):
+        metrics = RequestMetrics()
+        request.metrics = metrics
+        return metrics, current_metrics.set(metrics), time.perf_counter()
+
+    def finish(self, request, response, metrics, started):
+        total = time.perf_counter() - started
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries"',
+            f'view;dur={metrics.view_time * 1000:.2f}',
+            f'render;dur={metrics.render_time * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+        record = {
+            'url_name': url_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'connections': metrics.connections,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'view_ms': round(metrics.view_time * 1000, 2),
+            'render_ms': round(metrics.render_time * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }
+        pool = pool_stats()
+        if pool is not None:
+            record['pool'] = pool
+
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        budget = budgets.get(f'{request.method} {url_name}', budgets.get(url_name))
+        if budget is not None and metrics.queries > budget:
+            record['query_budget'] = budget
+            logger.warning(json.dumps(record))
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(
+                    f'{request.method} {request.path} ({url_name}) ran {metrics.queries} queries, budget is {budget}'
+                )
+        else:
+            logger.info(json.dumps(record))
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics.start_view()
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns, time the rendering separately
+        request.metrics.start_render()
+        response.add_post_render_callback(request.metrics.finish_render)
+        return response
+
+
+class DatabaseRoutingMiddleware:
+
+    # Gives SHOPLIFT.routers.PrimaryReplicaRouter the state of the current request. Unsafe methods and
+    # views with use_primary_database = True run on the primary, a user whose request wrote keeps
+    # reading from the primary for READ_YOUR_WRITES_SECONDS.
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        routing, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        self.finish(routing)
+        return response
+
+    async def __acall__(self, request):
+        routing, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        self.finish(routing)
+        return response
+
+    def start(self, request):
+        routing = RequestRouting(request, primary=request.method not in ('GET', 'HEAD', 'OPTIONS'))
+        return routing, current_routing.set(routing)
+
+    def finish(self, routing):
+        user = routing.user()
+        if routing.wrote and user is not None and user.is_authenticated:
+            stick_to_primary(user.pk)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        routing = current_routing.get()
+        if routing is not None and getattr(view_class, 'use_primary_database', False):
+            routing.primary = True
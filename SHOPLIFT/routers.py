@@ -0,0 +1,88 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject
+
+
+# Routing state of the request being served, None outside requests (commands, shell, migrations)
+current_routing = ContextVar('current_routing', default=None)
+
+
+class RequestRouting:
+
+    def __init__(self, request, primary=False):
+        self.request = request
+        # Set for unsafe methods and views with use_primary_database, every query goes to the primary
+        self.primary = primary
+        # Set once the request sent a write to the primary, its later reads have to see it
+        self.wrote = False
+        # Whether the user wrote within READ_YOUR_WRITES_SECONDS, None until the user is known
+        self.sticky = None
+
+    def user(self):
+        # DRF stores the user it authenticated on the request, the lazy session user of
+        # AuthenticationMiddleware would run a query of its own
+        user = self.request.__dict__.get('user')
+        if user is None or type(user) is SimpleLazyObject:
+            return None
+        return user
+
+    def use_primary(self):
+        if self.primary or self.wrote:
+            return True
+        if self.sticky is None:
+            user = self.user()
+            if user is None:
+                return False
+            self.sticky = bool(user.is_authenticated and cache.get(sticky_key(user.pk)))
+        return self.sticky
+
+
+def sticky_key(user_id):
+    return f'db:primary:{user_id}'
+
+
+# Keeps the user's reads on the primary until the replicas have caught up with their writes
+def stick_to_primary(user_id):
+    cache.set(sticky_key(user_id), True, settings.READ_YOUR_WRITES_SECONDS)
+
+
+# Sends the rest of the current request's reads to the primary while the replicas may still lag behind
+# a change committed at changed_at (a timestamp), READ_YOUR_WRITES_SECONDS bounding the lag like above
+def read_recent_changes_from_primary(changed_at):
+    routing = current_routing.get()
+    if routing is not None and changed_at is not None and time.time() - changed_at < settings.READ_YOUR_WRITES_SECONDS:
+        routing.primary = True
+
+
+# Sends writes to the primary and safe reads of requests to one of DATABASE_REPLICAS.
+# Reads stay on the primary inside transactions (select_for_update, cart item writes), for the
+# rest of a request that wrote, and for READ_YOUR_WRITES_SECONDS after a user's last write.
+# Queries outside requests always use the primary.
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if routing is None or not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block or routing.use_primary():
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        routing = current_routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication
+        return db not in settings.DATABASE_REPLICAS
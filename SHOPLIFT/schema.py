@@ -0,0 +1,72 @@
+import hashlib
+import threading
+
+import yaml
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+
+# Serves the OpenAPI schema without introspecting every view and serializer on each request.
+# SCHEMA_MODE "file" reads SCHEMA_FILE, built at deploy time with `manage.py spectacular --file`,
+# "cached" generates the schema on first use, "live" is drf-spectacular's own behaviour.
+# Each format is rendered once per process and served with an ETag and a max-age.
+class PrecomputedSchemaView(SpectacularAPIView):
+
+    # {version: schema} and {(format, media type, version): (content, etag)}, shared by every request
+    schemas = {}
+    rendered = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.schemas.clear()
+            cls.rendered.clear()
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        # Translated schemas are rare, they are still generated per request
+        if settings.SCHEMA_MODE == 'live' or (settings.USE_I18N and request.GET.get('lang')):
+            return super().get(request, *args, **kwargs)
+
+        version = self.api_version or request.version or self._get_version_parameter(request)
+        content, etag = self.get_rendered(request, version)
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            media_type = request.accepted_media_type
+            if request.accepted_renderer.charset:
+                media_type = f'{media_type}; charset={request.accepted_renderer.charset}'
+            response = HttpResponse(content, content_type=media_type)
+            response['Content-Disposition'] = f'inline; filename="{self._get_filename(request, version)}"'
+            response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=settings.SCHEMA_CACHE_MAX_AGE)
+        return response
+
+    def get_rendered(self, request, version):
+        renderer = request.accepted_renderer
+        key = (renderer.format, request.accepted_media_type, version)
+        if key not in self.rendered:
+            with self.lock:
+                if key not in self.rendered:
+                    content = renderer.render(self.get_schema(request, version), request.accepted_media_type)
+                    etag = quote_etag(hashlib.md5(content).hexdigest())
+                    self.rendered[key] = (content, etag)
+        return self.rendered[key]
+
+    # Called with the lock held
+    def get_schema(self, request, version):
+        if settings.SCHEMA_MODE == 'file':
+            # One file per deployment, whatever version is asked for. YAML also parses JSON
+            version = None
+            if version not in self.schemas:
+                with open(settings.SCHEMA_FILE, encoding='utf-8') as handle:
+                    self.schemas[version] = yaml.safe_load(handle)
+        elif version not in self.schemas:
+            generator = self.generator_class(urlconf=self.urlconf, api_version=version, patterns=self.patterns)
+            self.schemas[version] = generator.get_schema(request=request, public=self.serve_public)
+        return self.schemas[version]
@@ -50,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'SHOPLIFT.middleware.RequestMetricsMiddleware',
+    'SHOPLIFT.middleware.DatabaseRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,6 +80,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'SHOPLIFT.wsgi.application'
 
+# Routes the endpoints that have an async implementation to it, SHOPLIFT/asgi.py turns this on
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "0") == "1"
+
+# Threads hashing passwords for the async registration view
+PASSWORD_HASHING_WORKERS = int(os.environ.get("PASSWORD_HASHING_WORKERS", 4))
+
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
@@ -98,11 +106,139 @@ DATABASES = {
 # To use install render database url- pip install dj-database-url
 
 database_url = os.environ.get("DATABASE_URL")
-DATABASES['default'] = dj_database_url.parse(database_url)
-
-# Then install postgres driver - pip install psycopg2-binary
+# WSGI workers keep their connection for CONN_MAX_AGE seconds instead of opening one per request,
+# and ping it before reusing it after an error or a restarted database server
+DATABASES['default'] = dj_database_url.parse(
+    database_url,
+    conn_max_age=int(os.environ.get("CONN_MAX_AGE", 60)),
+    conn_health_checks=os.environ.get("CONN_HEALTH_CHECKS", "True").lower() == "true",
+)
+
+# Read replicas, space separated database URLs served as replica1, replica2... Safe reads of requests go
+# to a random replica, see SHOPLIFT/routers.py. Tests run them as mirrors of the test database.
+DATABASE_REPLICAS = []
+for number, replica_url in enumerate(os.environ.get("DATABASE_REPLICA_URLS", "").split(), start=1):
+    DATABASES[f"replica{number}"] = dj_database_url.parse(
+        replica_url,
+        conn_max_age=DATABASES['default']['CONN_MAX_AGE'],
+        conn_health_checks=DATABASES['default']['CONN_HEALTH_CHECKS'],
+        test_options={"MIRROR": "default"},
+    )
+    DATABASE_REPLICAS.append(f"replica{number}")
+
+DATABASE_ROUTERS = ['SHOPLIFT.routers.PrimaryReplicaRouter']
+
+# Seconds a user's reads stay on the primary after they wrote, should exceed the replication lag
+READ_YOUR_WRITES_SECONDS = int(os.environ.get("READ_YOUR_WRITES_SECONDS", 10))
+
+# ASGI runs every request's queries in its own thread, persistent connections would pile up per thread.
+# SHOPLIFT/asgi.py turns on a bounded psycopg 3 pool per process and database instead, requests wait up
+# to DATABASE_POOL_TIMEOUT seconds for a free connection and, with CONN_HEALTH_CHECKS, the pool checks
+# connections before lending them.
+DATABASE_POOL = os.environ.get("DATABASE_POOL", "0") == "1"
+for database in DATABASES.values():
+    if DATABASE_POOL and database['ENGINE'] == 'django.db.backends.postgresql':
+        database['CONN_MAX_AGE'] = 0
+        database.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': int(os.environ.get("DATABASE_POOL_MIN_SIZE", 2)),
+            'max_size': int(os.environ.get("DATABASE_POOL_MAX_SIZE", 10)),
+            'timeout': float(os.environ.get("DATABASE_POOL_TIMEOUT", 10)),
+            'max_idle': float(os.environ.get("DATABASE_POOL_MAX_IDLE", 600)),
+        }
+
+# Then install postgres driver - pip install "psycopg[binary,pool]"
 # Then makemigrations...
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+# Local memory by default, set REDIS_URL to share the cache between workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+redis_url = os.environ.get("REDIS_URL")
+if redis_url:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': redis_url,
+    }
+
+# Seconds a cached catalog page is kept, product changes invalidate it earlier
+CATALOG_CACHE_TIMEOUT = int(os.environ.get("CATALOG_CACHE_TIMEOUT", 300))
+
+# Seconds the id of a user's pending cart is cached, status changes and deletes invalidate it earlier
+PENDING_CART_CACHE_TIMEOUT = int(os.environ.get("PENDING_CART_CACHE_TIMEOUT", 3600))
+
+# Age in days after which cleanup_carts deletes untouched pending carts and archives paid and cancelled ones
+CART_ABANDONED_DAYS = int(os.environ.get("CART_ABANDONED_DAYS", 30))
+CART_ARCHIVE_DAYS = int(os.environ.get("CART_ARCHIVE_DAYS", 365))
+
+# Pending carts repriced per transaction when product prices change
+CART_REPRICE_BATCH_SIZE = int(os.environ.get("CART_REPRICE_BATCH_SIZE", 500))
+
+# Admin changelists show the planner's row estimate above this many rows instead of counting them (PostgreSQL)
+ADMIN_EXACT_COUNT_LIMIT = int(os.environ.get("ADMIN_EXACT_COUNT_LIMIT", 10000))
+
+# Request metrics
+# SHOPLIFT.middleware.RequestMetricsMiddleware adds Server-Timing headers and logs every request
+
+# Maximum number of queries per URL name, or "METHOD url-name" for a single method.
+# The counts include the authenticated user lookup and transaction statements. Exceeding one logs a warning
+QUERY_BUDGETS = {
+    'product-list': 3,
+    'POST product-list': 4,
+    'product-detail': 2,
+    'PUT product-detail': 8,
+    'PATCH product-detail': 8,
+    'DELETE product-detail': 7,
+    'product-category-list': 3,
+    'category-facets': 1,
+    'cart-list': 4,
+    'POST cart-list': 5,
+    'cart-detail': 5,
+    'DELETE cart-detail': 8,
+    'pending-cart': 8,
+    'item-list': 5,
+    'POST item-list': 8,
+    'item-bulk': 11,
+    'item-list-detail': 5,
+    'PUT item-list-detail': 8,
+    'PATCH item-list-detail': 8,
+    'DELETE item-list-detail': 7,
+    'register': 5,
+    'token_obtain_pair': 2,
+    'token_refresh': 2,
+    'POST checkout': 10,
+}
+
+# Raise instead of logging when a budget is exceeded, the test suite turns this on
+QUERY_BUDGET_STRICT = os.environ.get("QUERY_BUDGET_STRICT", "False").lower() == "true"
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'shoplift.requests': {
+            'handlers': ['console'],
+            # Set to INFO to log the metrics of every request
+            'level': os.environ.get("REQUEST_LOG_LEVEL", "WARNING"),
+            'propagate': False,
+        },
+    },
+}
+
+# Verified JWTs and their users are cached per worker for this many seconds (bounded by the token expiry)
+JWT_AUTH_CACHE_TTL = int(os.environ.get("JWT_AUTH_CACHE_TTL", 60))
+JWT_AUTH_CACHE_SIZE = int(os.environ.get("JWT_AUTH_CACHE_SIZE", 10000))
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -143,15 +279,23 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
+        'account.authentication.CachedJWTAuthentication'
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'commerce.api.renderers.FastJSONRenderer',
     ),
 }
 
 # Run this in terminal to create the file - python manage.py spectacular --file schema.yml
 SPECTACULAR_SETTINGS = {
     "TITLE": "Django DRF Shoplift"
-}
\ No newline at end of file
+}
+
+# How /api/schema/ gets the schema: "cached" generates it on first use and keeps it in memory,
+# "file" serves SCHEMA_FILE built at deploy time with the spectacular command above,
+# "live" introspects every view on each request
+SCHEMA_MODE = os.environ.get("SCHEMA_MODE", "cached")
+SCHEMA_FILE = os.environ.get("SCHEMA_FILE", BASE_DIR / "schema.yml")
+# Seconds clients and proxies may reuse the schema, the ETag revalidates it afterwards
+SCHEMA_CACHE_MAX_AGE = int(os.environ.get("SCHEMA_CACHE_MAX_AGE", 3600))
@@ -1,5 +1,20 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+# Unique index on the email, see account/migrations/0001_user_email_unique.py
+EMAIL_INDEX = 'account_user_email_uniq'
+
+
+# Tells a duplicate email from a duplicate username without querying again
+def violates_email_index(exc):
+    diag = getattr(exc.__cause__, 'diag', None)
+    if diag is not None:
+        # PostgreSQL names the violated index
+        return diag.constraint_name == EMAIL_INDEX
+    # SQLite names the column
+    return 'auth_user.email' in str(exc)
+
 
 class RegistrationSerializers(serializers.ModelSerializer):
 
@@ -15,27 +30,36 @@ class RegistrationSerializers(serializers.ModelSerializer):
             }
         }
 
-    def save(self):
-
-        password = self.validated_data['password']
-        password2 = self.validated_data['password2']
+    def check_passwords(self):
 
         # Confirm passwords are the same
-        if password != password2:
+        if self.validated_data['password'] != self.validated_data['password2']:
             raise serializers.ValidationError({
                 "error": "Passwords must be the same"
             })
-            
-        # Check if email already exists
-        if User.objects.filter(email=self.validated_data['email']).exists():
+
+    def save(self, password_hash=None):
+
+        self.check_passwords()
+
+        # To set up the password, the async view hashes it beforehand
+        account = User(username=self.validated_data['username'], email=self.validated_data.get('email', ''))
+        if password_hash is None:
+            account.set_password(self.validated_data['password'])
+        else:
+            account.password = password_hash
+
+        # The unique indexes on username and email reject duplicates
+        try:
+            with transaction.atomic():
+                account.save()
+        except IntegrityError as exc:
+            if violates_email_index(exc):
+                raise serializers.ValidationError({
+                    "error": "Email already exists"
+                })
             raise serializers.ValidationError({
-                "error": "Email already exists"
+                "username": ["A user with that username already exists."]
             })
-            
-        # To set up the password
-        account = User(username=self.validated_data['username'], email=self.validated_data['email'])
-        account.set_password(password)
-        account.save()
 
         return account
-            
\ No newline at end of file
@@ -1,11 +1,12 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from account.api.views import Register
+from account.api.views import AsyncRegister, Register
 
 
 urlpatterns = [
-    path('register/', Register, name='register'),
+    path('register/', AsyncRegister if settings.ASYNC_VIEWS else Register, name='register'),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh')
 ]
\ No newline at end of file
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class AccountConfig(AppConfig):
     name = 'account'
+
+    def ready(self):
+        # Connects the signal receivers and registers the schema extension
+        from account import schema, signals  # noqa: F401
@@ -0,0 +1,100 @@
+import copy
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+# Bounded LRU of verified tokens, each entry expires after a TTL or when its token does
+class TokenCache:
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._tokens_by_user = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'JWT_AUTH_CACHE_TTL', 60)
+
+    @property
+    def maxsize(self):
+        return getattr(settings, 'JWT_AUTH_CACHE_SIZE', 10000)
+
+    def get(self, raw_token):
+        with self._lock:
+            entry = self._entries.get(raw_token)
+            if entry is None:
+                return None
+            expires_at, user, validated_token = entry
+            if expires_at <= time.time():
+                self._remove(raw_token)
+                return None
+            self._entries.move_to_end(raw_token)
+            return user, validated_token
+
+    def set(self, raw_token, user, validated_token):
+        expires_at = time.time() + self.ttl
+        if 'exp' in validated_token:
+            expires_at = min(expires_at, validated_token['exp'])
+
+        with self._lock:
+            self._remove(raw_token)
+            self._entries[raw_token] = (expires_at, user, validated_token)
+            self._tokens_by_user[user.pk].add(raw_token)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for raw_token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(raw_token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def _remove(self, raw_token):
+        entry = self._entries.pop(raw_token, None)
+        if entry is None:
+            return
+        user_id = entry[1].pk
+        tokens = self._tokens_by_user[user_id]
+        tokens.discard(raw_token)
+        if not tokens:
+            del self._tokens_by_user[user_id]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+
+    # Skips signature verification and the user query for tokens seen recently by this worker.
+    # Saving or deleting a user drops its tokens here, other workers follow within JWT_AUTH_CACHE_TTL.
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        cached = token_cache.get(raw_token)
+        if cached is not None:
+            user, validated_token = cached
+            # Every request gets its own copy so views cannot leak changes into the cache
+            return copy.copy(user), validated_token
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user(validated_token)
+        token_cache.set(raw_token, copy.copy(user), validated_token)
+        return user, validated_token
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.db import connection, connections
+from django.test import AsyncRequestFactory, RequestFactory
+from django.urls import reverse
+
+from account.api.views import AsyncRegister, Register
+from commerce.reporting import percentile
+from commerce.seeding import BENCHMARK_PASSWORD
+
+
+def signup_payload(run, number):
+    return {
+        'username': f'bench-signup-{run}-{number}',
+        'email': f'bench-signup-{run}-{number}@example.com',
+        'password': BENCHMARK_PASSWORD,
+        'password2': BENCHMARK_PASSWORD,
+    }
+
+
+def summarize_signups(mode, concurrency, latencies, statuses, elapsed):
+    return {
+        'mode': mode,
+        'concurrency': concurrency,
+        'signups': len(latencies),
+        'seconds': round(elapsed, 3),
+        'signups_per_second': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'failures': sum(count for status, count in statuses.items() if status != 200),
+    }
+
+
+# Concurrent sign-ups through the registration views, the middleware stack is skipped for both.
+# "sync" hands each request to a thread like gthread workers, "async" runs them on one event loop.
+def run_signup_benchmark(mode, signups=100, concurrency=8):
+    run = f'{mode}-{time.time_ns()}'
+    latencies, statuses = [], {}
+
+    def record(started, response):
+        latencies.append((time.perf_counter() - started) * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    if mode == 'sync':
+        factory = RequestFactory()
+
+        def signup(number):
+            request = factory.post(reverse('register'), signup_payload(run, number), content_type='application/json')
+            started = time.perf_counter()
+            try:
+                record(started, Register(request))
+            finally:
+                # Django closes the connection after every request unless CONN_MAX_AGE is set
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(signup, range(signups)))
+        elapsed = time.perf_counter() - started
+
+    elif mode == 'async':
+        factory = AsyncRequestFactory()
+
+        async def signup(number, slots):
+            async with slots:
+                request = factory.post(reverse('register'), signup_payload(run, number), content_type='application/json')
+                started = time.perf_counter()
+                record(started, await AsyncRegister(request))
+
+        async def main():
+            slots = asyncio.Semaphore(concurrency)
+            try:
+                await asyncio.gather(*(signup(number, slots) for number in range(signups)))
+            finally:
+                await sync_to_async(connections.close_all)()
+
+        started = time.perf_counter()
+        asyncio.run(main())
+        elapsed = time.perf_counter() - started
+
+    else:
+        raise ValueError(f'Unknown sign-up benchmark mode {mode!r}')
+
+    return summarize_signups(mode, concurrency, latencies, statuses, elapsed)
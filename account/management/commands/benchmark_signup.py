@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from account.benchmarks import run_signup_benchmark
+from commerce.reporting import benchmark_metadata, write_results
+
+
+class Command(BaseCommand):
+    help = (
+        'Registers users concurrently through the sync registration view on a thread pool and through '
+        'the async one on an event loop, and reports sign-ups per second and latency percentiles.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--signups', type=int, default=200, help='Sign-ups per mode.')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument('--modes', nargs='+', choices=['sync', 'async'], default=['sync', 'async'])
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database between runs.')
+        parser.add_argument(
+            '--in-place', action='store_true',
+            help='Register the users in the database currently configured instead of creating a test database.',
+        )
+
+    def handle(self, *args, **options):
+        if options['signups'] < 2:
+            raise CommandError('--signups must be at least 2.')
+
+        old_name = None
+        if not options['in_place']:
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+
+        try:
+            results = self.run(options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        if options['output']:
+            metadata = benchmark_metadata(**{key: options[key] for key in ('signups', 'concurrency', 'modes')})
+            write_results(options['output'], metadata, results)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def run(self, options):
+        header = f"{'run':<16}{'signups/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'failures':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        results = {}
+        for concurrency in options['concurrency']:
+            for mode in options['modes']:
+                name = f'{mode}:{concurrency}'
+                result = results[name] = run_signup_benchmark(mode, signups=options['signups'], concurrency=concurrency)
+                self.stdout.write(
+                    f"{name:<16}{result['signups_per_second'] or 0:>12.1f}{result['p50_ms']:>10.2f}"
+                    f"{result['p95_ms']:>10.2f}{result['failures']:>10}"
+                )
+        return results
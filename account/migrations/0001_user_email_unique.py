@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    # Registration relies on this index instead of checking the email first.
+    # Blank emails stay allowed since the User model does not require one.
+    operations = [
+        migrations.RunSQL(
+            sql="CREATE UNIQUE INDEX account_user_email_uniq ON auth_user (email) WHERE email <> ''",
+            reverse_sql='DROP INDEX account_user_email_uniq',
+        ),
+    ]
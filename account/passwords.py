@@ -0,0 +1,29 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# PBKDF2 runs in hashlib without the GIL, so a few threads hash in parallel
+# while the event loop keeps serving other requests
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', 4),
+                    thread_name_prefix='password-hashing',
+                )
+    return _executor
+
+
+async def make_password_async(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), make_password, password)
@@ -0,0 +1,6 @@
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+
+
+# Documents CachedJWTAuthentication as the same bearer scheme as JWTAuthentication
+class CachedJWTScheme(SimpleJWTScheme):
+    target_class = 'account.authentication.CachedJWTAuthentication'
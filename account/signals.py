@@ -0,0 +1,12 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from account.authentication import token_cache
+
+
+# Deactivation, password changes and deletes must not be served from cached tokens
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_tokens(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.pk)
@@ -1,3 +1,152 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from account.api.serializers import RegistrationSerializers
+from account.api.views import AsyncRegister
+from account.authentication import CachedJWTAuthentication, token_cache
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class CachedJWTAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(username='jude', password='password123@')
+        self.authorize(self.user)
+
+    def authorize(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def test_repeated_requests_skip_the_user_query(self):
+        url = reverse('cart-list')
+        # The user and the carts
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(token_cache), 1)
+
+    def test_deactivation_and_password_change_invalidate_tokens(self):
+        url = reverse('cart-list')
+        self.client.get(url)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.user.set_password('another-password-456')
+        self.user.save()
+        self.assertEqual(len(token_cache), 0)
+
+    def test_cached_users_are_not_shared_between_requests(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        authentication = CachedJWTAuthentication()
+        first, _ = authentication.authenticate(request)
+        first.username = 'changed'
+        second, _ = authentication.authenticate(request)
+        self.assertEqual(second.username, 'jude')
+        self.assertIsNot(first, second)
+
+    @override_settings(JWT_AUTH_CACHE_SIZE=2)
+    def test_cache_is_bounded(self):
+        for number in range(4):
+            self.authorize(User.objects.create_user(username=f'user-{number}', password='password123@'))
+            self.client.get(reverse('cart-list'))
+        self.assertEqual(len(token_cache), 2)
+
+    @override_settings(JWT_AUTH_CACHE_TTL=0)
+    def test_entries_expire(self):
+        url = reverse('cart-list')
+        self.client.get(url)
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+    def test_invalid_tokens_are_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(self.client.get(reverse('cart-list')).status_code, 401)
+        self.assertEqual(len(token_cache), 0)
+
+
+def registration_payload(username='jude', email='jude@example.com', password2='password123@'):
+    return {'username': username, 'email': email, 'password': 'password123@', 'password2': password2}
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class RegistrationTests(APITestCase):
+
+    def test_register(self):
+        response = self.client.post(reverse('register'), registration_payload(), format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], 'jude@example.com')
+        self.assertIn('access', response.data['token'])
+        self.assertTrue(User.objects.get(username='jude').check_password('password123@'))
+
+    def test_duplicate_email_is_rejected_by_the_index(self):
+        User.objects.create_user(username='first', email='jude@example.com')
+        response = self.client.post(reverse('register'), registration_payload(), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Email already exists'})
+
+    def test_concurrent_duplicate_username_is_rejected_by_the_index(self):
+        User.objects.create_user(username='jude')
+        serializer = RegistrationSerializers(data=registration_payload(username='other'))
+        self.assertTrue(serializer.is_valid())
+        # Taken between the validation and the insert
+        serializer.validated_data['username'] = 'jude'
+        with self.assertRaises(ValidationError) as raised:
+            serializer.save()
+        self.assertIn('username', raised.exception.detail)
+
+    def test_blank_emails_are_not_unique(self):
+        User.objects.create_user(username='first')
+        response = self.client.post(reverse('register'), registration_payload(email=''), format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(User.objects.filter(email='').count(), 2)
+
+    def test_password_mismatch(self):
+        response = self.client.post(reverse('register'), registration_payload(password2='different'), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.exists())
+
+
+class AsyncRegistrationTests(TestCase):
+
+    async def register(self, payload):
+        request = AsyncRequestFactory().post('/account/register/', payload, content_type='application/json')
+        response = await AsyncRegister(request)
+        return response.status_code, json.loads(response.content)
+
+    async def test_register(self):
+        status, data = await self.register(registration_payload())
+        self.assertEqual(status, 200)
+        self.assertEqual(data['username'], 'jude')
+        self.assertIn('refresh', data['token'])
+        account = await User.objects.aget(username='jude')
+        self.assertTrue(account.check_password('password123@'))
+
+    async def test_errors_match_the_sync_view(self):
+        await User.objects.acreate(username='first', email='jude@example.com')
+
+        status, data = await self.register(registration_payload())
+        self.assertEqual((status, data), (400, {'error': 'Email already exists'}))
+
+        status, data = await self.register(registration_payload(username='first', email='other@example.com'))
+        self.assertEqual(status, 200)
+        self.assertIn('username', data)
+
+        status, data = await self.register(registration_payload(username='other', password2='different'))
+        self.assertEqual((status, data), (400, {'error': 'Passwords must be the same'}))
+
+    async def test_only_post_is_allowed(self):
+        response = await AsyncRegister(AsyncRequestFactory().get('/account/register/'))
+        self.assertEqual(response.status_code, 405)
@@ -1,7 +1,94 @@
+import json
+
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.utils.functional import cached_property
+
+from .cache import forget_carts
 from .models import Cart, CartItem, Product
 # Register your models here.
 
-admin.site.register(Cart)
-admin.site.register(Product)
-admin.site.register(CartItem)
\ No newline at end of file
+
+# Row count the PostgreSQL planner expects for the queryset, None on other databases
+def estimate_count(queryset):
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+# Changelists over large tables show the planner's estimate instead of running an exact COUNT(*),
+# small results (below ADMIN_EXACT_COUNT_LIMIT) are still counted exactly
+class EstimatedCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < settings.ADMIN_EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+
+    paginator = EstimatedCountPaginator
+    # The unfiltered total would be another COUNT(*) over the whole table
+    show_full_result_count = False
+
+
+@admin.register(Product)
+class ProductAdmin(LargeTableAdmin):
+
+    list_display = ['name', 'category', 'price', 'stock', 'in_stock', 'updated']
+    # Both filters have an index that also serves the default ordering
+    list_filter = ['category', 'in_stock']
+    # Also used by the product autocomplete of the cart item forms
+    search_fields = ['name']
+
+
+class CartItemInline(admin.TabularInline):
+
+    model = CartItem
+    autocomplete_fields = ['product']
+    readonly_fields = ['unit_price']
+    extra = 0
+
+
+@admin.register(Cart)
+class CartAdmin(LargeTableAdmin):
+
+    list_display = ['id', 'user', 'status', 'subtotal', 'item_count', 'created']
+    list_select_related = ['user']
+    list_filter = ['status']
+    raw_id_fields = ['user']
+    readonly_fields = ['subtotal', 'item_count']
+    inlines = [CartItemInline]
+
+    # Bulk deletes leave the cached versions and pending cart ids to the caller, see commerce/signals.py
+    def delete_queryset(self, request, queryset):
+        carts = list(queryset.values_list('pk', 'user_id', 'status'))
+        super().delete_queryset(request, queryset)
+        pending_users = [user_id for _, user_id, status in carts if status == 'PENDING']
+        transaction.on_commit(lambda: forget_carts([pk for pk, _, _ in carts], pending_users))
+
+
+@admin.register(CartItem)
+class CartItemAdmin(LargeTableAdmin):
+
+    # __str__ of the cart and the item read the user and the product
+    list_display = ['id', 'cart', 'product', 'quantity', 'unit_price']
+    list_select_related = ['cart__user', 'product']
+    raw_id_fields = ['cart']
+    autocomplete_fields = ['product']
+    readonly_fields = ['unit_price']
+
+    # The cart is locked before the item, like every item write of the API, the signals then update its totals
+    def save_model(self, request, obj, form, change):
+        Cart.objects.filter(pk=obj.cart_id).lock()
+        super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        Cart.objects.filter(pk=obj.cart_id).lock()
+        super().delete_model(request, obj)
@@ -0,0 +1,187 @@
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from django.core.paginator import InvalidPage, Paginator
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from commerce.api import views
+from commerce.api.renderers import FastJSONRenderer
+from commerce.cache import catalog_cache
+from commerce.search import search_products, use_postgres_search
+
+
+# Serves anonymous catalog reads on the event loop with the async ORM for ASGI deployments.
+# Everything else (writes, cursor pages, authenticated requests) goes to the DRF view, so
+# both paths share the cache entries, validators, URL names and response bodies.
+# Subclasses set sync_view_class and implement async get_data(request), returning a status and the data.
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncCatalogView(View):
+
+    sync_view_class = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        if cls.sync_view_class is None or not hasattr(cls, 'get_data'):
+            raise ImproperlyConfigured(f'{cls.__name__} needs a sync_view_class and a get_data() method.')
+        view = super().as_view(**initkwargs)
+        # Schema generators only enumerate DRF views, they document the one serving the same contract
+        view.cls = cls.sync_view_class
+        view.initkwargs = {}
+        return view
+
+    @classmethod
+    def get_sync_view(cls):
+        if '_sync_view' not in cls.__dict__:
+            cls._sync_view = cls.sync_view_class.as_view()
+        return cls._sync_view
+
+    def setup(self, request, *args, **kwargs):
+        super().setup(request, *args, **kwargs)
+        # Only used for its configuration and cache helpers, it never handles the request
+        self.catalog = self.sync_view_class(format_kwarg=None)
+        self.catalog.setup(request, *args, **kwargs)
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD') and self.can_serve(request):
+            return await self.get(request, *args, **kwargs)
+        return await sync_to_async(self.get_sync_view())(request, *args, **kwargs)
+
+    def can_serve(self, request):
+        # DRF rejects invalid credentials even on public endpoints, let it authenticate
+        return 'HTTP_AUTHORIZATION' not in request.META
+
+    async def get(self, request, *args, **kwargs):
+        etag = await self.catalog.aget_etag(request)
+        last_modified = await self.catalog.aget_last_modified(request)
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified) if last_modified else None,
+        )
+
+        if response is None:
+            key = await self.catalog.aget_cache_key(request)
+            data = await catalog_cache.aget(key)
+            cache_status = 'HIT'
+            if data is None:
+                cache_status = 'MISS'
+                self.catalog.route_cache_fill(last_modified)
+                status, data = await self.get_data(request)
+                if status != 200:
+                    return self.render(data, status)
+                await catalog_cache.aset(key, data)
+            response = self.render(data)
+            response['X-Cache'] = cache_status
+
+        if etag:
+            response.headers.setdefault('ETag', etag)
+        if last_modified:
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+        patch_cache_control(response, **self.catalog.cache_control)
+        return response
+
+    def render(self, data, status=200):
+        # RequestMetricsMiddleware only times the rendering of DRF responses on its own
+        metrics = getattr(self.request, 'metrics', None)
+        if metrics is not None:
+            metrics.start_render()
+        response = HttpResponse(
+            FastJSONRenderer().render(data), status=status, content_type=FastJSONRenderer.media_type,
+        )
+        if metrics is not None:
+            metrics.finish_render(response)
+        # Same default headers as the DRF view
+        for name, value in self.catalog.default_response_headers.items():
+            response[name] = value
+        return response
+
+    async def get_queryset(self, request):
+        queryset = self.catalog.get_queryset()
+        text = request.GET.get('search', '').replace('\x00', '')
+        if text:
+            if use_postgres_search():
+                queryset = search_products(queryset, text)
+            else:
+                # The in-process index may have to load the catalog first
+                queryset = await sync_to_async(search_products)(queryset, text)
+        return queryset
+
+
+class AsyncCatalogListView(AsyncCatalogView):
+
+    def can_serve(self, request):
+        # Cursor pages keep going through DRF's CursorPagination
+        paginator = self.catalog.pagination_class()
+        return super().can_serve(request) and not paginator.use_cursor(request)
+
+    # Same contract as PageNumberPagination: count, next, previous and results
+    async def get_data(self, request):
+        page_number_class = self.catalog.pagination_class.page_number_class
+        page_query_param = page_number_class.page_query_param
+
+        encoder = self.catalog.get_encoder()
+        rows = encoder.values(await self.get_queryset(request))
+
+        paginator = Paginator(rows, page_number_class.page_size)
+        # Paginator counts synchronously, the async count is stored in its cached property
+        count = await self.catalog.aget_known_count(request)
+        paginator.__dict__['count'] = count if count is not None else await rows.acount()
+
+        page_number = request.GET.get(page_query_param) or 1
+        if page_number in page_number_class.last_page_strings:
+            page_number = paginator.num_pages
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage:
+            return 404, {'detail': 'Invalid page.'}
+
+        bottom = (number - 1) * paginator.per_page
+        top = min(bottom + paginator.per_page, paginator.count)
+        results = [encoder.encode(row) async for row in rows[bottom:top].aiterator()]
+
+        url = request.build_absolute_uri()
+        next_link = previous_link = None
+        if number < paginator.num_pages:
+            next_link = replace_query_param(url, page_query_param, number + 1)
+        if number > 1:
+            previous_link = (
+                remove_query_param(url, page_query_param)
+                if number == 2
+                else replace_query_param(url, page_query_param, number - 1)
+            )
+
+        return 200, {
+            'count': paginator.count,
+            'next': next_link,
+            'previous': previous_link,
+            'results': results,
+        }
+
+
+class AsyncProductAV(AsyncCatalogListView):
+
+    sync_view_class = views.ProductAV
+
+
+class AsyncProductCategoryAV(AsyncCatalogListView):
+
+    sync_view_class = views.ProductCategoryAV
+
+
+class AsyncProductAVDetail(AsyncCatalogView):
+
+    sync_view_class = views.ProductAVDetail
+
+    async def get_data(self, request):
+        encoder = self.catalog.get_encoder()
+        # The detail view has no filter backends, ?search= does not apply
+        queryset = self.catalog.get_queryset().filter(pk=self.kwargs['pk'])
+        row = await encoder.values(queryset).afirst()
+        if row is None:
+            return 404, {'detail': f'No {queryset.model._meta.object_name} matches the given query.'}
+        return 200, encoder.encode(row)
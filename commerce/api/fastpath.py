@@ -0,0 +1,133 @@
+from collections import defaultdict
+
+from django.http import Http404
+from rest_framework.response import Response
+
+from commerce.api.serializers import CartItemSerializer, CartSerializer
+from commerce.models import CartItem
+
+
+# Precompiled encoder for a flat serializer, reads .values() rows instead of model instances.
+# It reuses the serializer's own fields to format each value so the output stays identical.
+class RowEncoder:
+
+    def __init__(self, serializer_class, overrides=None, exclude=()):
+        overrides = overrides or {}
+        self.columns = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only or name in exclude:
+                continue
+            if name in overrides:
+                lookup, convert = overrides[name]
+                self.columns.append((name, lookup, convert, True))
+            else:
+                self.columns.append((name, field.source.replace('.', '__'), field.to_representation, False))
+        self.lookups = [lookup for _, lookup, _, _ in self.columns]
+
+    def values(self, queryset, *extra):
+        return queryset.values(*self.lookups, *extra)
+
+    def encode(self, row):
+        data = {}
+        for name, lookup, convert, override in self.columns:
+            value = row[lookup]
+            # Overrides also receive None, like a SerializerMethodField would
+            data[name] = convert(value) if override or value is not None else None
+        return data
+
+    def encode_rows(self, rows):
+        encode = self.encode
+        return [encode(row) for row in rows]
+
+
+# Same value JSONRenderer produces for the Decimal returned by Cart.total_price
+def cart_total(value):
+    return float(value) if value else 0
+
+
+class CartEncoder:
+
+    def __init__(self):
+        self.cart = RowEncoder(
+            CartSerializer,
+            overrides={
+                'total_price': ('subtotal', cart_total),
+                'items_count': ('item_count', int),
+            },
+            exclude=('items',),
+        )
+        self.item = RowEncoder(CartItemSerializer)
+        self.field_names = list(CartSerializer().fields)
+
+    def values(self, queryset):
+        # Items are fetched by encode_rows(), prefetching does not apply to .values()
+        return self.cart.values(queryset.prefetch_related(None))
+
+    def encode_rows(self, rows):
+        rows = list(rows)
+        # Every item of the page in one query
+        items = defaultdict(list)
+        item_rows = self.item.values(
+            CartItem.objects.filter(cart_id__in=[row['id'] for row in rows]).order_by('id'),
+            'cart_id',
+        )
+        for item in item_rows:
+            items[item['cart_id']].append(self.item.encode(item))
+
+        encoded = []
+        for row in rows:
+            cart = self.cart.encode(row)
+            cart['items'] = items[row['id']]
+            encoded.append({name: cart[name] for name in self.field_names})
+        return encoded
+
+
+_encoders = {}
+
+
+def get_encoder(serializer_class):
+    if serializer_class not in _encoders:
+        if serializer_class is CartSerializer:
+            _encoders[serializer_class] = CartEncoder()
+        else:
+            _encoders[serializer_class] = RowEncoder(serializer_class)
+    return _encoders[serializer_class]
+
+
+class FastSerializationMixin:
+
+    # Serves list and retrieve from .values() rows through a precompiled encoder.
+    # Only for views whose object permissions are already enforced by get_queryset().
+    fast_serialization = False
+
+    def get_encoder(self):
+        return get_encoder(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_serialization:
+            return super().list(request, *args, **kwargs)
+
+        encoder = self.get_encoder()
+        rows = encoder.values(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(encoder.encode_rows(page))
+        return Response(encoder.encode_rows(rows))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.fast_serialization:
+            return super().retrieve(request, *args, **kwargs)
+
+        encoder = self.get_encoder()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        row = encoder.values(queryset).first()
+        if row is None:
+            # Same body as get_object_or_404() on the regular path
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        return Response(encoder.encode_rows([row])[0])
+
+
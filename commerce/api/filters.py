@@ -0,0 +1,13 @@
+from rest_framework import filters
+
+from commerce.search import search_products
+
+
+class ProductSearchFilter(filters.SearchFilter):
+
+    # Keeps the ?search= parameter but matches name and description through the full text index
+    search_description = 'Full text search on the product name and description.'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        return search_products(queryset, text.replace('\x00', ''))
@@ -0,0 +1,165 @@
+import hashlib
+
+from django.db.models import Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from SHOPLIFT.routers import read_recent_changes_from_primary
+from commerce.cache import catalog_cache, get_cart_version
+from commerce.facets import acategory_counts, category_counts, product_count
+from commerce.models import Cart
+from commerce.search import tokenize
+
+
+class ConditionalGetMixin:
+
+    # Answers If-None-Match / If-Modified-Since with a 304 before any query or serializer work.
+    # Validators must be cheap, they are computed on every GET.
+    cache_control = {'no_cache': True}
+
+    def get_etag_parts(self, request):
+        return None
+
+    def get_last_modified(self, request):
+        return None
+
+    def get_etag(self, request):
+        return self.make_etag(request, self.get_etag_parts(request))
+
+    def make_etag(self, request, parts):
+        if parts is None:
+            return None
+        raw = '|'.join(str(part) for part in (type(self).__name__, request.get_full_path(), *parts))
+        return quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        last_modified = self.get_last_modified(request)
+
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified) if last_modified else None,
+        )
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        if etag:
+            response.headers.setdefault('ETag', etag)
+        if last_modified:
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+        patch_cache_control(response, **self.cache_control)
+        return response
+
+
+class CatalogCacheMixin(ConditionalGetMixin):
+
+    # Name used in the cache key, defaults to the view class name
+    cache_endpoint = None
+
+    # Reads request.GET so the async views in commerce/api/async_views.py share the entries
+    def get_cache_key_parts(self, request):
+        params = request.GET
+        # Any other query parameter still has to produce a distinct entry
+        extra = '&'.join(
+            f'{key}={value}'
+            for key in sorted(params)
+            if key not in ('search', 'page')
+            for value in params.getlist(key)
+        )
+        return {
+            'endpoint': self.cache_endpoint or type(self).__name__,
+            'category': self.kwargs.get('categoryname'),
+            'search': params.get('search'),
+            'page': params.get('page'),
+            # Pagination links are absolute, so the host is part of the key
+            'extra': f"{request.get_host()}|{self.kwargs.get('pk', '')}|{extra}",
+        }
+
+    def get_cache_key(self, request):
+        return catalog_cache.make_key(**self.get_cache_key_parts(request))
+
+    async def aget_cache_key(self, request):
+        return await catalog_cache.amake_key(**self.get_cache_key_parts(request))
+
+    # The catalog version changes with every product write, so it validates every catalog response
+    def get_etag_parts(self, request):
+        return (catalog_cache.get_version(), request.get_host())
+
+    async def aget_etag(self, request):
+        return self.make_etag(request, (await catalog_cache.aget_version(), request.get_host()))
+
+    def get_last_modified(self, request):
+        return catalog_cache.last_modified()
+
+    async def aget_last_modified(self, request):
+        return await catalog_cache.alast_modified()
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        key = self.get_cache_key(request)
+        data = catalog_cache.get(key)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        self.route_cache_fill(catalog_cache.last_modified())
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            catalog_cache.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    # Every catalog query fills the cache under the current version, which is bumped once the primary
+    # committed a product change. Right after a change a lagging replica would get its old rows cached
+    # under the new version, so misses read from the primary then and from the replicas afterwards.
+    def route_cache_fill(self, last_modified):
+        read_recent_changes_from_primary(last_modified)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+
+class FacetCountMixin:
+
+    # Page number pagination reuses the cached category counts instead of a COUNT(*),
+    # see commerce/facets.py. Searches still count their matches
+    def get_known_count(self, request):
+        if tokenize(request.GET.get('search', '')):
+            return None
+        return product_count(category_counts(), self.kwargs.get('categoryname'))
+
+    async def aget_known_count(self, request):
+        if tokenize(request.GET.get('search', '')):
+            return None
+        return product_count(await acategory_counts(), self.kwargs.get('categoryname'))
+
+
+class CartConditionalGetMixin(ConditionalGetMixin):
+
+    cache_control = {'private': True, 'no_cache': True}
+
+    # The cart the validators describe
+    def get_validator_queryset(self, request):
+        return Cart.objects.filter(pk=self.kwargs.get('pk'), user=request.user)
+
+    # Read from the cart row in one query, so a worker whose cache missed a write never answers 304.
+    # Every item write updates the stored totals and Cart.updated, product renames change the
+    # newest product updated time.
+    def get_etag_parts(self, request):
+        state = (
+            self.get_validator_queryset(request)
+            .order_by()
+            .annotate(products_updated=Max('items__product__updated'))
+            .values_list('pk', 'status', 'updated', 'subtotal', 'item_count', 'products_updated')
+            .first()
+        )
+        if state is None:
+            return None
+        return (request.user.pk, get_cart_version(state[0]), *state)
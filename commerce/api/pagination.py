@@ -1,11 +1,111 @@
-from rest_framework.pagination import PageNumberPagination
+from functools import partial
+
+from django.core.paginator import Paginator
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+
+from commerce.search import tokenize
+
+
+# Paginator that takes a count known in advance instead of running COUNT(*)
+class CountedPaginator(Paginator):
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            # Paginator.count is a cached property
+            self.__dict__['count'] = count
+
 
 class ProductPagination(PageNumberPagination):
 
     page_size = 5
     page_query_param = 'page'
 
+    # Views can skip the COUNT(*) by returning the row count from get_known_count(request)
+    def paginate_queryset(self, queryset, request, view=None):
+        count = view.get_known_count(request) if hasattr(view, 'get_known_count') else None
+        self.django_paginator_class = partial(CountedPaginator, count=count)
+        return super().paginate_queryset(queryset, request, view=view)
+
 class ChartItemPagination(PageNumberPagination):
 
     page_size = 10
     page_query_param = 'page'
+
+
+# Keyset pagination on a stable ordering, no COUNT(*) or OFFSET so deep pages stay as fast as the first one
+class ProductCursorPagination(CursorPagination):
+
+    page_size = 5
+    ordering = ('-created', '-id')
+
+class ChartItemCursorPagination(CursorPagination):
+
+    page_size = 10
+    # Cart items have no created field, the id already follows insertion order
+    ordering = ('id',)
+
+
+class OptionalCursorPagination(BasePagination):
+
+    # Clients keep page number pagination unless they send ?pagination=cursor or a cursor
+    page_number_class = None
+    cursor_class = None
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.page_number_paginator = self.page_number_class()
+        self.cursor_paginator = self.cursor_class()
+        self.paginator = self.page_number_paginator
+
+    def use_cursor(self, request):
+        return (
+            request.GET.get(self.mode_query_param) == 'cursor'
+            or self.cursor_paginator.cursor_query_param in request.GET
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.check_cursor(request)
+            self.paginator = self.cursor_paginator
+        return self.paginator.paginate_queryset(queryset, request, view=view)
+
+    # Raises for requests whose results have an ordering of their own that a cursor cannot follow
+    def check_cursor(self, request):
+        pass
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number_paginator.get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            *self.page_number_paginator.get_schema_operation_parameters(view),
+            *self.cursor_paginator.get_schema_operation_parameters(view),
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to "cursor" to switch to cursor pagination.',
+                'schema': {'type': 'string', 'enum': ['cursor']},
+            },
+        ]
+
+
+class ProductListPagination(OptionalCursorPagination):
+
+    page_number_class = ProductPagination
+    cursor_class = ProductCursorPagination
+
+    # Search results are ordered by relevance, the cursor would page them by creation time instead
+    def check_cursor(self, request):
+        if tokenize(request.GET.get('search', '')):
+            raise ValidationError({self.mode_query_param: ['Search results are paged by page number.']})
+
+class ChartItemListPagination(OptionalCursorPagination):
+
+    page_number_class = ChartItemPagination
+    cursor_class = ChartItemCursorPagination
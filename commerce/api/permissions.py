@@ -14,11 +14,12 @@ class IsAdminorReadonly(permissions.BasePermission):
 class IsCart(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
+        # Compare ids so no related user row is loaded
         if isinstance(obj, Cart):
-            return obj.user == request.user
+            return obj.user_id == request.user.id
 
         if isinstance(obj, CartItem):
-            return obj.cart.user == request.user
+            return obj.cart.user_id == request.user.id
 
         return False
 
@@ -8,7 +8,8 @@ class CartItemSerializer(serializers.ModelSerializer):
 
     product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all(), write_only=True)
     product_name = serializers.CharField(source='product.name', read_only=True)
-    product_price = serializers.DecimalField(source='product.price', max_digits=10, decimal_places=2, read_only = True)
+    # The price the item was added at, not the live product price
+    product_price = serializers.DecimalField(source='unit_price', max_digits=10, decimal_places=2, read_only = True)
 
     class Meta:
 
@@ -22,6 +23,20 @@ class CartItemSerializer(serializers.ModelSerializer):
         return value
 
 
+class CartItemBulkSerializer(serializers.Serializer):
+
+    # Plain ids so the view can resolve every product in a single query
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=0)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        # Bound the number of operations accepted in one request
+        kwargs.setdefault('max_length', 100)
+        kwargs.setdefault('allow_empty', False)
+        return super().many_init(*args, **kwargs)
+
+
 class CartSerializer(serializers.ModelSerializer):
 
     items = CartItemSerializer(many=True, read_only=True)
@@ -55,6 +70,26 @@ class ProductSerializer(serializers.ModelSerializer):
 
         model = Product
         fields = '__all__'
+
+    # The flag follows the stock of tracked products
+    def validate(self, attrs):
+        if attrs.get('stock') is not None:
+            attrs['in_stock'] = attrs['stock'] > 0
+        return attrs
     
 
-    
\ No newline at end of file
+    
+
+class CategoryFacetSerializer(serializers.Serializer):
+
+    code = serializers.CharField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+    in_stock = serializers.IntegerField()
+
+
+class CatalogFacetsSerializer(serializers.Serializer):
+
+    count = serializers.IntegerField()
+    in_stock = serializers.IntegerField()
+    categories = CategoryFacetSerializer(many=True)
@@ -1,15 +1,27 @@
+from django.conf import settings
 from django.urls import path
 
-from commerce.api import views
+from commerce.api import async_views, views
 
 
+# ASGI deployments serve the public catalog reads from the async views
+if settings.ASYNC_VIEWS:
+    ProductAV, ProductAVDetail, ProductCategoryAV = (
+        async_views.AsyncProductAV, async_views.AsyncProductAVDetail, async_views.AsyncProductCategoryAV,
+    )
+else:
+    ProductAV, ProductAVDetail, ProductCategoryAV = views.ProductAV, views.ProductAVDetail, views.ProductCategoryAV
+
 urlpatterns = [
-    path('products/', views.ProductAV.as_view(), name='product-list'),
-    path('product/<int:pk>/', views.ProductAVDetail.as_view(), name='product-detail'),
-    path('category/<str:categoryname>/products/', views.ProductCategoryAV.as_view(), name='product-category-list'),
+    path('products/', ProductAV.as_view(), name='product-list'),
+    path('product/<int:pk>/', ProductAVDetail.as_view(), name='product-detail'),
+    path('category/<str:categoryname>/products/', ProductCategoryAV.as_view(), name='product-category-list'),
+    path('categories/facets/', views.CategoryFacetsAV.as_view(), name='category-facets'),
     path('carts/', views.CartAV.as_view(), name='cart-list'),
     path('cart/<int:pk>/', views.CartDetailAV.as_view(), name='cart-detail'),
     path('cart/<int:pk>/items/', views.CartItemAV.as_view(), name='item-list'),
+    path('cart/<int:pk>/items/bulk/', views.CartItemBulkAV.as_view(), name='item-bulk'),
     path('cart/item/<int:pk>/', views.CartItemDetailAV.as_view(), name='item-list-detail'),
+    path('cart/<int:pk>/checkout/', views.CheckoutAV.as_view(), name='checkout'),
     path('cart/pending/', views.PendingCartAV.as_view(), name="pending-cart"),
 ]
\ No newline at end of file
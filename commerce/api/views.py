@@ -1,25 +1,57 @@
 from django.shortcuts import get_object_or_404
-from django.db import transaction, IntegrityError
+from django.db import transaction
 from rest_framework.exceptions import ValidationError
-from rest_framework import generics, filters
+from rest_framework.response import Response
+from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema
 
 
-from commerce.api.serializers import ProductSerializer, CartSerializer, CartItemSerializer
-from commerce.models import Product, Cart, CartItem
+from commerce.api.serializers import (
+    ProductSerializer, CartSerializer, CartItemSerializer, CartItemBulkSerializer, CatalogFacetsSerializer,
+)
+from commerce.models import Product, Cart, CartItem, InsufficientStock
+from commerce.cache import bump_cart_version, catalog_cache, clear_pending_cart_id, get_pending_cart_id, set_pending_cart_id
 from commerce.api.permissions import IsAdminorReadonly, IsCart
-from commerce.api.pagination import ProductPagination, ChartItemPagination
+from commerce.api.pagination import ProductListPagination, ChartItemListPagination
+from commerce.api.mixins import CatalogCacheMixin, CartConditionalGetMixin, FacetCountMixin
+from commerce.api.filters import ProductSearchFilter
+from commerce.api.fastpath import FastSerializationMixin
+from commerce.facets import category_counts
+from commerce.signals import skip_cart_updates_after_delete
 
 
-class PendingCartAV(generics.RetrieveAPIView):
+class PendingCartAV(CartConditionalGetMixin, generics.RetrieveAPIView):
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
+    # Creates the cart on first use and is where clients resume editing, a replica could lag behind
+    use_primary_database = True
+
+    def get_validator_queryset(self, request):
+        return Cart.objects.filter(user=request.user, status='PENDING')
+
+    def get_cart_id(self, request):
+        cart_id = get_pending_cart_id(request.user.pk)
+        if cart_id is None:
+            # Get or create pending cart, get_or_create() already retries the lookup when a
+            # concurrent request created it first and the constraint rejected this insert
+            cart, _ = Cart.objects.get_or_create(user=request.user, status='PENDING')
+            cart_id = cart.pk
+            set_pending_cart_id(request.user.pk, cart_id)
+        return cart_id
 
     def get_object(self):
-        # Get or create pending cart
-        cart, _ = Cart.objects.get_or_create(user=self.request.user, status='PENDING')
+        # The cached id is only trusted if it still points to this user's pending cart
+        cart = Cart.objects.with_details().filter(
+            pk=self.get_cart_id(self.request),
+            user=self.request.user,
+            status='PENDING',
+        ).first()
+
+        if cart is None:
+            clear_pending_cart_id(self.request.user.pk)
+            cart = Cart.objects.with_details().get(pk=self.get_cart_id(self.request))
 
         return cart
 
@@ -30,26 +62,27 @@ class CartItemAV(generics.ListCreateAPIView):
     serializer_class = CartItemSerializer
 
     permission_classes = [IsAuthenticated]
-    pagination_class = ChartItemPagination
+    pagination_class = ChartItemListPagination
 
-    def get_cart(self):
+    def get_cart(self, lock=False):
         # Ensure the cart belongs to the authenticated user
         return get_object_or_404(
-            Cart,
+            Cart.objects.select_for_update() if lock else Cart,
             pk=self.kwargs['pk'],
             user=self.request.user
         )
 
     def get_queryset(self):
         cart = self.get_cart()
-        # Return only items belonging to this cart
-        return CartItem.objects.filter(cart=cart)
+        # Return only items belonging to this cart, in the order they were added
+        return CartItem.objects.filter(cart=cart).select_related('product').order_by('id')
 
     
     # To ensure this method fails if any database operation fails
     @transaction.atomic
     def perform_create(self, serializer):
-        cart = self.get_cart()
+        # The status is read under the cart lock, so a checkout committing meanwhile is seen
+        cart = self.get_cart(lock=True)
 
         # Raise error for any cart status other than pending
         if cart.status != 'PENDING':
@@ -57,58 +90,180 @@ class CartItemAV(generics.ListCreateAPIView):
 
         product = serializer.validated_data["product"]
         quantity = serializer.validated_data.get("quantity", 1)
+        if not product.has_stock():
+            raise ValidationError({"product": ["This product is out of stock."]})
 
-        try:
-            # Get or create cart item
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart,
-                product=product,
-                defaults={"quantity": quantity}
-            )
-        except IntegrityError:
-            # Incase someone else created it simultaneously, safely fetch and update
-            cart_item = CartItem.objects.select_for_update().get(cart=cart, product=product)
-            created = False
+        # Insert the item or increment its quantity in one atomic statement
+        serializer.instance = CartItem.objects.add_to_cart(cart, product, quantity)
 
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+        # Checked on the resulting quantity, raising rolls the increment back
+        if not product.has_stock(serializer.instance.quantity):
+            raise ValidationError({"quantity": [f"Only {product.stock} left in stock."]})
 
+        # The raw upsert sends no signals
+        transaction.on_commit(lambda: bump_cart_version(cart.pk))
 
 
 
-class CartItemDetailAV(generics.RetrieveUpdateDestroyAPIView):
 
-    serializer_class = CartItemSerializer
-    permission_classes = [IsAuthenticated, IsCart]
+class CartItemBulkAV(generics.GenericAPIView):
 
-    def get_cart(self):
-        # Ensure the cart belongs to the authenticated user
-        return get_object_or_404(
-            Cart,
+    serializer_class = CartItemBulkSerializer
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        request=CartItemBulkSerializer(many=True),
+        responses=CartSerializer,
+    )
+    @transaction.atomic
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        # Lock the cart once for the whole batch
+        cart = get_object_or_404(
+            Cart.objects.select_for_update(),
             pk=self.kwargs['pk'],
             user=self.request.user
         )
+        if cart.status != 'PENDING':
+            raise ValidationError("You can only add items to a pending cart.")
+
+        # The last operation wins when a product is listed more than once
+        operations = {op['product']: op['quantity'] for op in serializer.validated_data}
+
+        # Resolve every product, its current price and stock in one query
+        products = Product.objects.only('price', 'stock', 'in_stock').in_bulk(operations)
+        missing = sorted(set(operations) - set(products))
+        if missing:
+            raise ValidationError({"product": [f"Invalid pk \"{pk}\" - object does not exist." for pk in missing]})
+        short = [pk for pk, quantity in operations.items() if quantity > 0 and not products[pk].has_stock(quantity)]
+        if short:
+            raise ValidationError({"quantity": [f"Not enough stock for product \"{pk}\"." for pk in short]})
+
+        # A quantity sets the item quantity, zero removes the item
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=cart, product_id=product_id, quantity=quantity, unit_price=products[product_id].price)
+                for product_id, quantity in operations.items()
+                if quantity > 0
+            ],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity', 'unit_price'],
+        )
+        removed = [product_id for product_id, quantity in operations.items() if quantity == 0]
+        if removed:
+            removals = CartItem.objects.filter(cart=cart, product_id__in=removed)
+            removals.delete()
+            skip_cart_updates_after_delete(removals)
+
+        # The upserts send no signals and the response shows the totals, they are updated here
+        Cart.objects.filter(pk=cart.pk).update_totals(lock=False, touch=True)
+        transaction.on_commit(lambda: bump_cart_version(cart.pk))
+
+        cart = Cart.objects.with_details().get(pk=cart.pk)
+        return Response(CartSerializer(cart, context=self.get_serializer_context()).data)
+
+
+
+
+# Pays a pending cart: its products are taken out of stock and its status becomes PAID in one transaction
+class CheckoutAV(generics.GenericAPIView):
+
+    serializer_class = CartSerializer
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        request=None,
+        responses=CartSerializer,
+    )
+    @transaction.atomic
+    def post(self, request, *args, **kwargs):
+        # The cart is locked before the products. Every item write locks it and checks its status
+        # under the lock, so its items cannot change meanwhile
+        cart = get_object_or_404(
+            Cart.objects.select_for_update(),
+            pk=self.kwargs['pk'],
+            user=self.request.user
+        )
+        if cart.status != 'PENDING':
+            raise ValidationError("Only a pending cart can be checked out.")
+
+        quantities = dict(cart.items.values_list('product_id', 'quantity'))
+        if not quantities:
+            raise ValidationError("Cannot check out an empty cart.")
+
+        try:
+            sold_out = Product.objects.reserve(quantities)
+        except InsufficientStock as e:
+            raise ValidationError({"stock": [
+                f"Only {available} left of product \"{pk}\"." for pk, available in sorted(e.shortages.items())
+            ]})
+
+        cart.status = 'PAID'
+        cart.save(update_fields=['status', 'updated'])
+
+        # Cached catalog pages may show a stale stock count until they expire, checkout is what decides.
+        # Selling a product out is the change worth invalidating them for.
+        if sold_out:
+            transaction.on_commit(catalog_cache.bump_version)
+
+        cart = Cart.objects.with_details().get(pk=cart.pk)
+        return Response(CartSerializer(cart, context=self.get_serializer_context()).data)
+
+
+
+
+class CartItemDetailAV(generics.RetrieveUpdateDestroyAPIView):
+
+    serializer_class = CartItemSerializer
+    permission_classes = [IsAuthenticated, IsCart]
 
     def get_queryset(self):
-        cart = self.get_cart()
-        # Return only items belonging to this cart
-        return CartItem.objects.filter(cart=cart)
+        # avoid AnonymousUser errors when generating schema
+        if getattr(self, 'swagger_fake_view', False):
+            return CartItem.objects.none()
+        # The pk in the URL is the item's, only items of the user's carts are visible.
+        # The cart is joined so IsCart and the status checks need no extra query
+        return CartItem.objects.filter(cart__user=self.request.user).select_related('cart', 'product')
     
+    # Locks the cart of the item and checks its status under the lock. The cart joined to the item
+    # may have been checked out since it was read, and the items of a paid cart never change.
+    def lock_pending_cart(self, item, message):
+        status = Cart.objects.select_for_update().filter(pk=item.cart_id).values_list('status', flat=True).first()
+        if status != 'PENDING':
+            raise ValidationError(message)
+
+    # The cart is locked before the item is written, like CartItem.objects.add_to_cart() does,
+    # and its totals are updated by the CartItem signals in the same transaction
+    @transaction.atomic
+    def perform_update(self, serializer):
+        self.lock_pending_cart(serializer.instance, "You can only change items of a pending cart.")
+        product = serializer.validated_data.get('product', serializer.instance.product)
+        quantity = serializer.validated_data.get('quantity', serializer.instance.quantity)
+        # Lowering a quantity is always allowed
+        grows = product != serializer.instance.product or quantity > serializer.instance.quantity
+        if grows and not product.has_stock(quantity):
+            raise ValidationError({"quantity": ["Not enough stock for this product."]})
+        serializer.save()
+
+    @transaction.atomic
     def perform_destroy(self, instance):
         # Raises error if the cart is not a pending cart to prevent deletion of cart items
-        if instance.cart.status != 'PENDING':
-            raise ValidationError("Cannot delete items from this cart")
+        self.lock_pending_cart(instance, "Cannot delete items from this cart")
         instance.delete()
 
 
 
 
-class CartAV(generics.ListCreateAPIView):
+class CartAV(FastSerializationMixin, generics.ListCreateAPIView):
 
     permission_classes = [IsAuthenticated]
 
     serializer_class = CartSerializer
+    # Serialize reads from .values() rows, see commerce/api/fastpath.py
+    fast_serialization = True
 
     @extend_schema(
         responses=CartSerializer(many=True),
@@ -117,8 +272,9 @@ class CartAV(generics.ListCreateAPIView):
         # avoid AnonymousUser errors when generating schema
         if getattr(self, 'swagger_fake_view', False):
             return Cart.objects.all()
-        # Makes sure only one query each is sent to the database to fetch cart items and associated products in bulk
-        return Cart.objects.filter(user=self.request.user).prefetch_related('items__product')
+        # Makes sure only one query each is sent to the database to fetch cart items and associated products in bulk,
+        # the totals are stored on the carts
+        return Cart.objects.filter(user=self.request.user).with_details()
 
     
     @extend_schema(
@@ -138,52 +294,78 @@ class CartAV(generics.ListCreateAPIView):
 
 
 
-class CartDetailAV(generics.RetrieveUpdateDestroyAPIView):
+class CartDetailAV(CartConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
 
     permission_classes = [IsAuthenticated, IsCart]
 
     serializer_class = CartSerializer
 
     def get_queryset(self):
-        # Makes sure only one query each is sent to the database to fetch cart items and associated products in bulk
-        return Cart.objects.filter(user=self.request.user).prefetch_related('items__product')
+        # Makes sure only one query each is sent to the database to fetch cart items and associated products in bulk,
+        # the totals are stored on the carts
+        return Cart.objects.filter(user=self.request.user).with_details()
         
 
 
-class ProductCategoryAV(generics.ListAPIView):
+class ProductCategoryAV(CatalogCacheMixin, FacetCountMixin, FastSerializationMixin, generics.ListAPIView):
 
     permission_classes = [AllowAny]
-    pagination_class = ProductPagination
+    pagination_class = ProductListPagination
 
     serializer_class = ProductSerializer
+    # Serialize reads from .values() rows, see commerce/api/fastpath.py
+    fast_serialization = True
 
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['name']
+    filter_backends = [ProductSearchFilter]
 
     def get_queryset(self):
         # Filter products by category from the URL
         category = self.kwargs['categoryname']
 
-        # Perform a case-insensitive match on the category code
-        return Product.objects.filter(category__iexact=category)
+        # Codes are stored upper case, an exact match can use product_category_created_idx
+        # where category__iexact could not
+        return Product.objects.filter(category=category.upper())
     
 
 
-class ProductAV(generics.ListCreateAPIView):
+class ProductAV(CatalogCacheMixin, FacetCountMixin, FastSerializationMixin, generics.ListCreateAPIView):
 
     permission_classes = [IsAdminorReadonly]
-    pagination_class = ProductPagination
+    pagination_class = ProductListPagination
 
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    # Serialize reads from .values() rows, see commerce/api/fastpath.py
+    fast_serialization = True
 
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['name']
+    filter_backends = [ProductSearchFilter]
 
 
-class ProductAVDetail(generics.RetrieveUpdateDestroyAPIView):
+class ProductAVDetail(CatalogCacheMixin, FastSerializationMixin, generics.RetrieveUpdateDestroyAPIView):
 
     permission_classes = [IsAdminorReadonly]
 
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    # Serialize reads from .values() rows, see commerce/api/fastpath.py
+    fast_serialization = True
+
+
+# Product and in stock counts per category for the navigation, served from the cached counts
+class CategoryFacetsAV(CatalogCacheMixin, generics.RetrieveAPIView):
+
+    permission_classes = [AllowAny]
+    serializer_class = CatalogFacetsSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        counts = category_counts()
+        names = dict(Product.CATEGORY_CHOICES)
+        categories = [
+            {'code': code, 'name': names.get(code, code), **facet}
+            for code, facet in counts.items()
+        ]
+        return Response(self.get_serializer({
+            'count': sum(facet['count'] for facet in categories),
+            'in_stock': sum(facet['in_stock'] for facet in categories),
+            'categories': categories,
+        }).data)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CommerceConfig(AppConfig):
     name = 'commerce'
+
+    def ready(self):
+        # Connects the signal receivers and registers the system checks
+        from commerce import checks, signals  # noqa: F401
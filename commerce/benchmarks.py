@@ -0,0 +1,369 @@
+import http.client
+import os
+import random
+import statistics
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Callable, Optional
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from commerce.api.views import CheckoutAV
+from commerce.models import Cart, CartItem, Product
+from commerce.reporting import percentile
+from commerce.seeding import BENCHMARK_PASSWORD, WORDS, seed_checkouts
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    # Receives the iteration number and returns (url, payload)
+    build: Callable
+    user: Optional[User] = None
+    anonymous: bool = False
+    expected_status: tuple = (200,)
+
+
+def authenticated_client(user):
+    client = APIClient()
+    if user is not None:
+        token = RefreshToken.for_user(user).access_token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return client
+
+
+# One or more scenarios for every route of commerce/api/urls.py and account/api/urls.py
+def build_scenarios(dataset, rng):
+    user = dataset.users[0]
+    pending = dataset.pending_carts[user.id]
+    products = dataset.product_ids
+    item_ids = list(CartItem.objects.filter(cart__user=user).values_list('id', flat=True))
+    # Out of stock products cannot be added to carts
+    in_stock = list(Product.objects.filter(in_stock=True).values_list('id', flat=True))
+    refresh = str(RefreshToken.for_user(user))
+    # Products to delete are created up front so the timed requests only delete
+    deletable = []
+
+    def product_payload():
+        return {'name': 'Benchmark product', 'price': '19.99', 'category': rng.choice(dataset.categories)}
+
+    def delete_target(iteration):
+        return reverse('product-detail', args=[deletable[iteration]]), None
+
+    # Every iteration checks out a new pending cart of the last user, scenarios run in order so this
+    # one is listed last and the first user's pending cart stays pending
+    buyer = dataset.users[-1]
+
+    def checkout_target(iteration):
+        cart, _ = Cart.objects.get_or_create(user=buyer, status='PENDING')
+        cart.items.all().delete()
+        Cart.objects.filter(pk=cart.pk).update_totals()
+        for product in Product.objects.filter(pk__in=rng.sample(in_stock, min(3, len(in_stock)))):
+            CartItem.objects.add_to_cart(cart, product)
+        return reverse('checkout', args=[cart.pk]), None
+
+    return deletable, [
+        Scenario('product-list', 'get', lambda i: (reverse('product-list'), {'page': i % 20 + 1}), anonymous=True),
+        Scenario('product-list:cursor', 'get', lambda i: (reverse('product-list'), {'pagination': 'cursor'}), anonymous=True),
+        Scenario('product-list:search', 'get', lambda i: (reverse('product-list'), {'search': rng.choice(WORDS)[:4]}), anonymous=True),
+        Scenario('product-list:create', 'post', lambda i: (reverse('product-list'), product_payload()), user=dataset.admin, expected_status=(201,)),
+        Scenario('product-detail', 'get', lambda i: (reverse('product-detail', args=[rng.choice(products)]), None), anonymous=True),
+        Scenario('product-detail:update', 'patch', lambda i: (reverse('product-detail', args=[rng.choice(products)]), {'price': '25.00'}), user=dataset.admin),
+        Scenario('product-detail:delete', 'delete', delete_target, user=dataset.admin, expected_status=(204,)),
+        Scenario('product-category-list', 'get', lambda i: (reverse('product-category-list', args=[rng.choice(dataset.categories)]), None), anonymous=True),
+        Scenario('category-facets', 'get', lambda i: (reverse('category-facets'), None), anonymous=True),
+        Scenario('cart-list', 'get', lambda i: (reverse('cart-list'), None), user=user),
+        Scenario('cart-detail', 'get', lambda i: (reverse('cart-detail', args=[pending]), None), user=user),
+        Scenario('pending-cart', 'get', lambda i: (reverse('pending-cart'), None), user=user),
+        Scenario('item-list', 'get', lambda i: (reverse('item-list', args=[pending]), None), user=user),
+        Scenario('item-list:add', 'post', lambda i: (reverse('item-list', args=[pending]), {'product': rng.choice(in_stock), 'quantity': 1}), user=user, expected_status=(201,)),
+        Scenario('item-bulk', 'post', lambda i: (
+            reverse('item-bulk', args=[pending]),
+            [{'product': product_id, 'quantity': rng.randint(1, 3)} for product_id in rng.sample(in_stock, min(10, len(in_stock)))],
+        ), user=user),
+        Scenario('item-list-detail', 'get', lambda i: (reverse('item-list-detail', args=[rng.choice(item_ids)]), None), user=user),
+        Scenario('register', 'post', lambda i: (reverse('register'), {
+            'username': f'bench-register-{i}-{rng.random()}',
+            'email': f'bench-register-{i}-{rng.random()}@example.com',
+            'password': BENCHMARK_PASSWORD,
+            'password2': BENCHMARK_PASSWORD,
+        }), anonymous=True),
+        Scenario('token_obtain_pair', 'post', lambda i: (reverse('token_obtain_pair'), {'username': user.username, 'password': BENCHMARK_PASSWORD}), anonymous=True),
+        Scenario('token_refresh', 'post', lambda i: (reverse('token_refresh'), {'refresh': refresh}), anonymous=True),
+        Scenario('checkout', 'post', checkout_target, user=buyer),
+    ]
+
+
+def run_scenario(scenario, iterations, warmup=2, cold_cache=False):
+    client = authenticated_client(None if scenario.anonymous else scenario.user)
+    request = getattr(client, scenario.method)
+    latencies, queries, unexpected = [], [], {}
+
+    for iteration in range(warmup + iterations):
+        url, payload = scenario.build(iteration)
+        if cold_cache:
+            cache.clear()
+
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            if scenario.method == 'get':
+                response = request(url, payload)
+            else:
+                response = request(url, payload, format='json')
+            elapsed = time.perf_counter() - started
+
+        if iteration < warmup:
+            continue
+        latencies.append(elapsed * 1000)
+        queries.append(len(ctx.captured_queries))
+        if response.status_code not in scenario.expected_status:
+            unexpected[response.status_code] = unexpected.get(response.status_code, 0) + 1
+
+    total_seconds = sum(latencies) / 1000
+    return {
+        'method': scenario.method.upper(),
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'throughput_rps': round(len(latencies) / total_seconds, 1) if total_seconds else None,
+        'queries_per_request': round(statistics.fmean(queries), 2),
+        'max_queries': max(queries),
+        'unexpected_statuses': unexpected,
+    }
+
+
+def run_benchmarks(dataset, iterations=50, warmup=2, cold_cache=False, only=None, seed=42):
+    rng = random.Random(seed)
+    deletable, scenarios = build_scenarios(dataset, rng)
+    deletable.extend(
+        Product.objects.create(name='Benchmark victim', price=Decimal('1.00'), category='EX').pk
+        for _ in range(warmup + iterations)
+    )
+
+    results = {}
+    for scenario in scenarios:
+        if only and scenario.name.split(':')[0] not in only and scenario.name not in only:
+            continue
+        results[scenario.name] = run_scenario(scenario, iterations, warmup=warmup, cold_cache=cold_cache)
+    return results
+
+
+# Concurrent checkouts through CheckoutAV on a thread pool, the middleware stack is skipped.
+# Reports the throughput and latency along with the stock invariants: nothing oversold and
+# exactly the paid quantities taken out of stock.
+def run_checkout_benchmark(checkouts=200, concurrency=32, skus=5, stock=100, seed=42):
+    run = time.time_ns()
+    carts, products = seed_checkouts(run, checkouts, skus=skus, stock=stock, seed=seed)
+    users = {user.pk: user for user in User.objects.filter(carts__in=carts)}
+    view = CheckoutAV.as_view()
+    factory = APIRequestFactory()
+    latencies, statuses, errors = [], {}, {}
+    lock = threading.Lock()
+
+    def checkout(cart):
+        request = factory.post(reverse('checkout', args=[cart.pk]))
+        force_authenticate(request, user=users[cart.user_id])
+        started = time.perf_counter()
+        try:
+            status = view(request, pk=cart.pk).status_code
+        except Exception as e:
+            status = 'error'
+            with lock:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        finally:
+            connection.close()
+        with lock:
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(checkout, carts))
+    elapsed = time.perf_counter() - started
+
+    paid = CartItem.objects.filter(cart__in=carts, cart__status='PAID')
+    sold = dict(paid.values('product').annotate(total=Sum('quantity')).values_list('product', 'total'))
+    remaining = dict(Product.objects.filter(pk__in=[product.pk for product in products]).values_list('pk', 'stock'))
+    return {
+        'concurrency': concurrency,
+        'checkouts': len(latencies),
+        'skus': skus,
+        'seconds': round(elapsed, 3),
+        'checkouts_per_second': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'paid': statuses.get(200, 0),
+        'rejected': statuses.get(400, 0),
+        'errors': errors,
+        'consistent': all(remaining[product.pk] == stock - sold.get(product.pk, 0) for product in products),
+    }
+
+
+# Server commands for the same application, WSGI under gunicorn sync workers and ASGI under uvicorn
+SERVERS = {
+    'wsgi': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', 'SHOPLIFT.wsgi:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', 'warning',
+    ],
+    'asgi': lambda port, workers: [
+        sys.executable, '-m', 'uvicorn', 'SHOPLIFT.asgi:application',
+        '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers),
+        '--log-level', 'warning', '--no-access-log',
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with status {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server did not listen on port {port} within {timeout}s')
+
+
+# Anonymous catalog reads, the endpoints that have an async implementation
+def catalog_paths(rng, count=200):
+    categories = [code for code, _ in Product.CATEGORY_CHOICES]
+    product_ids = list(Product.objects.values_list('id', flat=True)[:1000])
+    pages = max(Product.objects.count() // 5, 1)
+    paths = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.4:
+            paths.append(f"{reverse('product-list')}?page={rng.randint(1, min(pages, 50))}")
+        elif kind < 0.6:
+            paths.append(f"{reverse('product-list')}?search={rng.choice(WORDS)[:4]}")
+        elif kind < 0.8:
+            paths.append(reverse('product-category-list', args=[rng.choice(categories)]))
+        elif product_ids:
+            paths.append(reverse('product-detail', args=[rng.choice(product_ids)]))
+    return paths
+
+
+def drive_server(port, paths, concurrency=16, duration=10, headers=None):
+    headers = {'Host': 'localhost', **(headers or {})}
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local, number = [], offset
+        try:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                connection.request('GET', paths[number % len(paths)], headers=headers)
+                response = connection.getresponse()
+                response.read()
+                local.append(((time.perf_counter() - started) * 1000, response.status))
+                number += concurrency
+                if response.will_close:
+                    connection.close()
+        finally:
+            connection.close()
+        with lock:
+            for latency, status in local:
+                latencies.append(latency)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(offset,)) for offset in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50), 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 3) if latencies else None,
+        'statuses': statuses,
+    }
+
+
+# Starts the server on the configured database and drives the paths over HTTP
+def run_server_benchmark(server, paths, workers=2, concurrency=16, duration=10, warmup=2, env=None, headers=None):
+    port = free_port()
+    env = {**os.environ, 'ASYNC_VIEWS': '1' if server == 'asgi' else '0', **(env or {})}
+    process = subprocess.Popen(SERVERS[server](port, workers), env=env)
+    try:
+        wait_for_server(port, process)
+        if warmup:
+            drive_server(port, paths, concurrency=concurrency, duration=warmup, headers=headers)
+        result = drive_server(port, paths, concurrency=concurrency, duration=duration, headers=headers)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return {'server': server, 'workers': workers, 'concurrency': concurrency, **result}
+
+
+# Environment of the servers for each way of handling database connections, see SHOPLIFT/settings.py
+CONNECTION_MODES = {
+    'new': {'CONN_MAX_AGE': '0', 'DATABASE_POOL': '0'},
+    'persistent': {'CONN_MAX_AGE': '60', 'DATABASE_POOL': '0'},
+    'pool': {'CONN_MAX_AGE': '0', 'DATABASE_POOL': '1'},
+}
+
+
+# Authenticated reads of one user's carts, small endpoints where connecting is a large share of the latency
+def cart_paths(user):
+    paths = [reverse('cart-list'), reverse('pending-cart')]
+    pending = Cart.objects.filter(user=user, status='PENDING').values_list('id', flat=True).first()
+    if pending is not None:
+        paths += [reverse('cart-detail', args=[pending]), reverse('item-list', args=[pending])]
+    return paths
+
+
+# Sessions PostgreSQL (14 or later) has accepted on the current database since its statistics were reset
+def sessions_opened():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_stat_clear_snapshot()')
+        cursor.execute('SELECT sessions FROM pg_stat_database WHERE datname = current_database()')
+        return cursor.fetchone()[0]
+
+
+# Serves the cart endpoints of user under server with the given connection mode and counts the
+# database sessions it opened, warmup included
+def run_connection_benchmark(server, mode, user, workers=2, concurrency=16, duration=10, warmup=2):
+    token = RefreshToken.for_user(user).access_token
+    before = sessions_opened()
+    result = run_server_benchmark(
+        server, cart_paths(user),
+        workers=workers, concurrency=concurrency, duration=duration, warmup=warmup,
+        env=CONNECTION_MODES[mode], headers={'Authorization': f'Bearer {token}'},
+    )
+    # Backends report their statistics when they exit, the server has just stopped
+    time.sleep(1)
+    return {'mode': mode, 'sessions_opened': sessions_opened() - before, **result}
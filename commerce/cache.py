@@ -0,0 +1,153 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_LAST_MODIFIED_KEY = 'catalog:last-modified'
+
+
+def get_version(cache, key):
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so an evicted version never reuses old keys
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key, time.time_ns())
+    return version
+
+
+# Same as get_version() for the async views, without blocking the event loop on the cache
+async def aget_version(cache, key):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), None)
+        version = await cache.aget(key, time.time_ns())
+    return version
+
+
+def bump_version(cache, key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+        return version
+
+
+# Read-through cache for the public catalog endpoints.
+# Entries are keyed on the catalog version, so bumping the version when a product
+# changes invalidates every cached page at once without tracking individual keys.
+class CatalogCache:
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+    def get_version(self):
+        return get_version(self.cache, CATALOG_VERSION_KEY)
+
+    async def aget_version(self):
+        return await aget_version(self.cache, CATALOG_VERSION_KEY)
+
+    def bump_version(self):
+        self.cache.set(CATALOG_LAST_MODIFIED_KEY, time.time(), None)
+        return bump_version(self.cache, CATALOG_VERSION_KEY)
+
+    # Time of the last product change seen by this cache, None when unknown
+    def last_modified(self):
+        return self.cache.get(CATALOG_LAST_MODIFIED_KEY)
+
+    async def alast_modified(self):
+        return await self.cache.aget(CATALOG_LAST_MODIFIED_KEY)
+
+    def build_key(self, version, endpoint, category=None, search=None, page=None, extra=''):
+        raw = '|'.join(str(part) for part in (endpoint, category or '', search or '', page or '', extra))
+        digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+        return f'catalog:{version}:{endpoint}:{digest}'
+
+    def make_key(self, endpoint, **parts):
+        return self.build_key(self.get_version(), endpoint, **parts)
+
+    async def amake_key(self, endpoint, **parts):
+        return self.build_key(await self.aget_version(), endpoint, **parts)
+
+    def count(self, data):
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def get(self, key):
+        return self.count(self.cache.get(key))
+
+    async def aget(self, key):
+        return self.count(await self.cache.aget(key))
+
+    def set(self, key, data):
+        self.cache.set(key, data, self.timeout)
+
+    async def aset(self, key, data):
+        await self.cache.aset(key, data, self.timeout)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+catalog_cache = CatalogCache()
+
+
+# Version counter per cart, bumped whenever the cart or one of its items changes
+def cart_version_key(cart_id):
+    return f'cart:{cart_id}:version'
+
+
+def get_cart_version(cart_id, alias='default'):
+    return get_version(caches[alias], cart_version_key(cart_id))
+
+
+def bump_cart_version(cart_id, alias='default'):
+    return bump_version(caches[alias], cart_version_key(cart_id))
+
+
+# Id of the pending cart of each user, so /api/cart/pending/ can skip get_or_create
+def pending_cart_key(user_id):
+    return f'cart:pending:{user_id}'
+
+
+def get_pending_cart_id(user_id, alias='default'):
+    return caches[alias].get(pending_cart_key(user_id))
+
+
+def set_pending_cart_id(user_id, cart_id, alias='default'):
+    caches[alias].set(pending_cart_key(user_id), cart_id, getattr(settings, 'PENDING_CART_CACHE_TIMEOUT', 3600))
+
+
+def clear_pending_cart_id(user_id, alias='default'):
+    caches[alias].delete(pending_cart_key(user_id))
+
+
+# Drops the cached versions and pending cart ids of carts removed in bulk, so no ETag outlives its cart
+def forget_carts(cart_ids, user_ids=(), alias='default'):
+    keys = [cart_version_key(cart_id) for cart_id in cart_ids] + [pending_cart_key(user_id) for user_id in user_ids]
+    if keys:
+        caches[alias].delete_many(keys)
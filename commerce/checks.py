@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared(alias='default'):
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+# The catalog pages, their ETag and Last-Modified hang off versions kept in the default cache.
+# A cache per process only sees the product writes of its own worker, the others would keep
+# serving, and answering 304 for, the old catalog.
+@register(Tags.caches, deploy=True)
+def check_catalog_cache(app_configs, **kwargs):
+    if cache_is_shared():
+        return []
+    return [
+        Error(
+            'The default cache is local to each process, workers would not see catalog changes made by the others.',
+            hint='Set REDIS_URL to a cache shared by every worker.',
+            id='commerce.E001',
+        )
+    ]
+
+
+# Reads stay on the primary after a user's write through a flag kept in the default cache, see
+# SHOPLIFT.routers.stick_to_primary(). A cache per process only holds the flags of the writes its
+# own worker served, the user's next request on another worker would read a lagging replica.
+@register(Tags.caches)
+def check_replica_cache(app_configs, **kwargs):
+    if not settings.DATABASE_REPLICAS or cache_is_shared():
+        return []
+    return [
+        Error(
+            'DATABASE_REPLICAS need a cache shared by every worker, users would not read their own writes.',
+            hint='Set REDIS_URL to a cache shared by every worker.',
+            id='commerce.E002',
+        )
+    ]
@@ -0,0 +1,58 @@
+from django.db.models import Count, Q
+
+from commerce.cache import catalog_cache
+from commerce.models import Product
+
+
+# Product and in stock counts per category for the navigation, computed with one GROUP BY and cached
+# under the catalog version, so every product write (signals, imports, checkouts that sell out)
+# refreshes them. Catalog pagination reuses them instead of running its own COUNT(*).
+def counts_query():
+    return (
+        Product.objects.order_by()
+        .values('category')
+        .annotate(count=Count('id'), in_stock=Count('id', filter=Q(in_stock=True)))
+    )
+
+
+def build_counts(rows):
+    # Every category is listed, empty ones included
+    counts = {code: {'count': 0, 'in_stock': 0} for code, _ in Product.CATEGORY_CHOICES}
+    for row in rows:
+        counts[row['category']] = {'count': row['count'], 'in_stock': row['in_stock']}
+    return counts
+
+
+def counts_key():
+    return catalog_cache.make_key('facets')
+
+
+async def acounts_key():
+    return await catalog_cache.amake_key('facets')
+
+
+# Read from the cache directly, the hit and miss stats are for the catalog pages
+def category_counts():
+    key = counts_key()
+    counts = catalog_cache.cache.get(key)
+    if counts is None:
+        counts = build_counts(counts_query())
+        catalog_cache.set(key, counts)
+    return counts
+
+
+# Same as category_counts() for the async catalog views
+async def acategory_counts():
+    key = await acounts_key()
+    counts = await catalog_cache.cache.aget(key)
+    if counts is None:
+        counts = build_counts([row async for row in counts_query()])
+        await catalog_cache.aset(key, counts)
+    return counts
+
+
+# Number of products listed for a category, every product when category is None
+def product_count(counts, category=None):
+    if category is None:
+        return sum(facet['count'] for facet in counts.values())
+    return counts.get(category.upper(), {}).get('count', 0)
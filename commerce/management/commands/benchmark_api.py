@@ -0,0 +1,92 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from commerce.benchmarks import run_benchmarks
+from commerce.reporting import benchmark_metadata, write_results
+from commerce.seeding import seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a throwaway database with a configurable catalog, users and carts, drives every API '
+        'route through the test client and reports latency percentiles, throughput and queries per request.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--carts-per-user', type=int, default=5)
+        parser.add_argument('--items-per-cart', type=int, default=5)
+        parser.add_argument('--iterations', type=int, default=50, help='Timed requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per scenario.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--only', nargs='*', help='URL names or scenario names to run.')
+        parser.add_argument('--cold-cache', action='store_true', help='Clear the cache before every request.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database between runs.')
+        parser.add_argument(
+            '--in-place', action='store_true',
+            help='Seed the database currently configured instead of creating a test database.',
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError('--iterations must be at least 2.')
+
+        old_name = None
+        if not options['in_place']:
+            # Same naming and cleanup as the test runner, the real database is never touched
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+
+        try:
+            # The test client sends requests to "testserver"
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                results = self.run(options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        if options['output']:
+            metadata = benchmark_metadata(**{
+                key: options[key]
+                for key in ('products', 'users', 'carts_per_user', 'items_per_cart', 'iterations', 'warmup', 'seed', 'cold_cache')
+            })
+            write_results(options['output'], metadata, results)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def run(self, options):
+        started = time.perf_counter()
+        dataset = seed_dataset(
+            products=options['products'],
+            users=options['users'],
+            carts_per_user=options['carts_per_user'],
+            items_per_cart=options['items_per_cart'],
+            seed=options['seed'],
+        )
+        self.stdout.write(f'Seeded {connection.vendor} database in {time.perf_counter() - started:.2f}s')
+
+        results = run_benchmarks(
+            dataset,
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            cold_cache=options['cold_cache'],
+            only=options['only'],
+            seed=options['seed'],
+        )
+
+        header = f"{'scenario':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<24}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                f"{result['throughput_rps'] or 0:>10.1f}{result['queries_per_request']:>10.2f}"
+            )
+            if result['unexpected_statuses']:
+                self.stderr.write(f"  {name} returned unexpected statuses {result['unexpected_statuses']}")
+        return results
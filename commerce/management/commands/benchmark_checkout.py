@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from commerce.benchmarks import run_checkout_benchmark
+from commerce.reporting import benchmark_metadata, write_results
+
+
+class Command(BaseCommand):
+    help = (
+        'Checks out pending carts concurrently while they compete for the stock of a few products, '
+        'and reports checkouts per second, latency percentiles and whether the stock stayed consistent.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=500, help='Carts checked out per run.')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+        parser.add_argument('--skus', type=int, default=5, help='Products every cart draws its items from.')
+        parser.add_argument('--stock', type=int, default=300, help='Initial stock of each product.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database between runs.')
+        parser.add_argument(
+            '--in-place', action='store_true',
+            help='Create the carts in the database currently configured instead of creating a test database.',
+        )
+
+    def handle(self, *args, **options):
+        if options['checkouts'] < 2:
+            raise CommandError('--checkouts must be at least 2.')
+        if options['skus'] < 1:
+            raise CommandError('--skus must be at least 1.')
+
+        old_name = None
+        if not options['in_place']:
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+
+        try:
+            results = self.run(options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        if options['output']:
+            metadata = benchmark_metadata(
+                **{key: options[key] for key in ('checkouts', 'concurrency', 'skus', 'stock')}
+            )
+            write_results(options['output'], metadata, results)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def run(self, options):
+        header = (
+            f"{'concurrency':<13}{'checkouts/s':>13}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+            f"{'paid':>7}{'rejected':>10}{'errors':>8}  consistent"
+        )
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        results = {}
+        for concurrency in options['concurrency']:
+            result = results[str(concurrency)] = run_checkout_benchmark(
+                checkouts=options['checkouts'], concurrency=concurrency, skus=options['skus'], stock=options['stock'],
+            )
+            self.stdout.write(
+                f"{concurrency:<13}{result['checkouts_per_second'] or 0:>13.1f}{result['p50_ms']:>10.2f}"
+                f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['paid']:>7}{result['rejected']:>10}"
+                f"{sum(result['errors'].values()):>8}  {'yes' if result['consistent'] else 'NO'}"
+            )
+        return results
@@ -0,0 +1,80 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from commerce.benchmarks import run_connection_benchmark
+from commerce.reporting import benchmark_metadata, write_results
+from commerce.seeding import seed_dataset
+
+
+# Server and connection mode of every configuration, WSGI keeps a connection per worker,
+# ASGI would open one per request thread and uses the pool instead
+CONFIGURATIONS = {
+    'wsgi-new': ('wsgi', 'new'),
+    'wsgi-persistent': ('wsgi', 'persistent'),
+    'asgi-new': ('asgi', 'new'),
+    'asgi-pool': ('asgi', 'pool'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Serves the authenticated cart endpoints under gunicorn and uvicorn with a new database connection per '
+        'request, persistent connections (WSGI) and a connection pool (ASGI), and compares per-request latency '
+        'and the number of PostgreSQL sessions opened. Uses the PostgreSQL database currently configured.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--configurations', nargs='+', choices=list(CONFIGURATIONS), default=list(CONFIGURATIONS),
+        )
+        parser.add_argument('--workers', type=int, default=2, help='Worker processes for each server.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent keep-alive clients.')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of timed load per configuration.')
+        parser.add_argument('--warmup', type=float, default=2, help='Seconds of untimed load per configuration.')
+        parser.add_argument(
+            '--seed-products', type=int, default=0,
+            help='Seed this many products (with users and carts) into the configured database first.',
+        )
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Connection pooling and session statistics need PostgreSQL.')
+
+        if options['seed_products']:
+            seed_dataset(products=options['seed_products'])
+        user = User.objects.filter(carts__status='PENDING').order_by('id').first()
+        if user is None:
+            raise CommandError('No user has a pending cart, pass --seed-products to seed some.')
+
+        header = (
+            f"{'configuration':<18}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+            f"{'sessions':>10}{'errors':>8}"
+        )
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        results = {}
+        for name in options['configurations']:
+            server, mode = CONFIGURATIONS[name]
+            result = results[name] = run_connection_benchmark(
+                server, mode, user,
+                workers=options['workers'],
+                concurrency=options['concurrency'],
+                duration=options['duration'],
+                warmup=options['warmup'],
+            )
+            errors = sum(count for status, count in result['statuses'].items() if status >= 400)
+            self.stdout.write(
+                f"{name:<18}{result['throughput_rps'] or 0:>10.1f}{result['p50_ms'] or 0:>10.2f}"
+                f"{result['p95_ms'] or 0:>10.2f}{result['p99_ms'] or 0:>10.2f}"
+                f"{result['sessions_opened']:>10}{errors:>8}"
+            )
+
+        if options['output']:
+            metadata = benchmark_metadata(**{
+                key: options[key] for key in ('configurations', 'workers', 'concurrency', 'duration', 'warmup')
+            })
+            write_results(options['output'], metadata, results)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,69 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from commerce.benchmarks import catalog_paths, run_server_benchmark
+from commerce.models import Product
+from commerce.reporting import benchmark_metadata, write_results
+from commerce.seeding import seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Starts the application under gunicorn (WSGI, sync workers) and under uvicorn (ASGI, async catalog views) '
+        'with the same worker count and compares requests per second on the public catalog endpoints. '
+        'The servers run as separate processes, so they use the database currently configured.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+        parser.add_argument('--workers', type=int, default=2, help='Worker processes for each server.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent keep-alive clients.')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of timed load per server.')
+        parser.add_argument('--warmup', type=float, default=2, help='Seconds of untimed load per server.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--seed-products', type=int, default=0,
+            help='Seed this many products (with users and carts) into the configured database first.',
+        )
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] == ':memory:':
+            raise CommandError('The servers run in other processes and cannot share an in-memory database.')
+
+        if options['seed_products']:
+            seed_dataset(products=options['seed_products'], seed=options['seed'])
+        if not Product.objects.exists():
+            raise CommandError('The catalog is empty, pass --seed-products to seed it.')
+
+        paths = catalog_paths(random.Random(options['seed']))
+        # The servers must not inherit this process' open connection
+        connection.close()
+
+        header = f"{'server':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        results = {}
+        for server in options['servers']:
+            result = results[server] = run_server_benchmark(
+                server, paths,
+                workers=options['workers'],
+                concurrency=options['concurrency'],
+                duration=options['duration'],
+                warmup=options['warmup'],
+            )
+            errors = sum(count for status, count in result['statuses'].items() if status >= 400)
+            self.stdout.write(
+                f"{server:<8}{result['throughput_rps'] or 0:>10.1f}{result['p50_ms'] or 0:>10.2f}"
+                f"{result['p95_ms'] or 0:>10.2f}{result['p99_ms'] or 0:>10.2f}{errors:>10}"
+            )
+
+        if options['output']:
+            metadata = benchmark_metadata(**{
+                key: options[key] for key in ('servers', 'workers', 'concurrency', 'duration', 'warmup', 'seed')
+            })
+            write_results(options['output'], metadata, results)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
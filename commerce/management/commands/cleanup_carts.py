@@ -0,0 +1,107 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from commerce.cache import forget_carts
+from commerce.models import ArchivedCart, ArchivedCartItem, Cart, CartItem
+
+
+CART_FIELDS = ['id', 'user_id', 'status', 'created', 'updated', 'subtotal', 'item_count']
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes pending carts abandoned for --pending-days and archives (or deletes) paid and cancelled '
+        'carts older than --history-days, in keyset batches of short transactions. Safe to interrupt, '
+        'the next run continues with the carts that are left.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pending-days', type=int, default=settings.CART_ABANDONED_DAYS)
+        parser.add_argument('--history-days', type=int, default=settings.CART_ARCHIVE_DAYS)
+        parser.add_argument('--batch-size', type=int, default=500, help='Carts per transaction.')
+        parser.add_argument('--delete-history', action='store_true', help='Delete old carts instead of archiving them.')
+        parser.add_argument('--after-id', type=int, default=0, help='Only look at carts with a larger id.')
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to pause between batches.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the carts.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        if options['pending_days'] < 1 or options['history_days'] < 1:
+            raise CommandError('--pending-days and --history-days must be at least 1.')
+
+        now = timezone.now()
+        jobs = [
+            ('abandoned', Cart.objects.filter(
+                status='PENDING', updated__lt=now - timedelta(days=options['pending_days']),
+            ), False),
+            ('historical', Cart.objects.filter(
+                status__in=['PAID', 'CANCELLED'], updated__lt=now - timedelta(days=options['history_days']),
+            ), not options['delete_history']),
+        ]
+
+        for name, carts, archive in jobs:
+            carts = carts.filter(pk__gt=options['after_id'])
+            if options['dry_run']:
+                self.stdout.write(f'{carts.count()} {name} carts')
+                continue
+            self.run(name, carts, archive, options)
+
+    def run(self, name, carts, archive, options):
+        started = time.perf_counter()
+        removed = items = 0
+        last_pk = options['after_id']
+        action = 'archived' if archive else 'deleted'
+
+        while True:
+            ids = list(carts.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            last_pk = ids[-1]
+
+            batch_carts, batch_items = self.remove(carts.filter(pk__in=ids), archive)
+            removed += batch_carts
+            items += batch_items
+
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{name}: {action} {removed} carts and {items} items, last id {last_pk}')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        elapsed = time.perf_counter() - started
+        rate = (removed + items) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{removed} {name} carts {action} with {items} items in {elapsed:.2f}s ({rate:.0f} rows/s)'
+        ))
+
+    # One short transaction per batch. Carts locked by a request (an item write or a checkout) are
+    # skipped rather than waited for, and the age and status filters are checked again under the
+    # lock, so a cart that came back to life since the scan is kept.
+    @transaction.atomic
+    def remove(self, carts, archive):
+        rows = list(carts.select_for_update(skip_locked=True, of=('self',)).order_by('pk').values(*CART_FIELDS))
+        if not rows:
+            return 0, 0
+        ids = [row['id'] for row in rows]
+        items = CartItem.objects.filter(cart_id__in=ids)
+
+        if archive:
+            ArchivedCart.objects.bulk_create([ArchivedCart(**row) for row in rows])
+            ArchivedCartItem.objects.bulk_create([
+                ArchivedCartItem(product_name=item.pop('product__name'), **item)
+                for item in items.values('id', 'cart_id', 'product_id', 'product__name', 'quantity', 'unit_price')
+            ])
+
+        # The items go with their carts. Bulk deletes leave the totals and cached versions of the carts
+        # that are going away to us, see commerce/signals.py
+        _, deleted = Cart.objects.filter(pk__in=ids).delete()
+        item_count = deleted.get(CartItem._meta.label, 0)
+
+        pending_users = [row['user_id'] for row in rows if row['status'] == 'PENDING']
+        transaction.on_commit(lambda: forget_carts(ids, pending_users))
+        return len(ids), item_count
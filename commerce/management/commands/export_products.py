@@ -0,0 +1,63 @@
+import csv
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from commerce.models import Product
+
+
+EXPORT_FIELDS = ['id', 'name', 'description', 'price', 'category', 'stock', 'in_stock', 'created', 'updated']
+
+
+def export_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if value is None or isinstance(value, (bool, int)):
+        return value
+    return str(value)
+
+
+class Command(BaseCommand):
+    help = 'Streams the product catalog to a CSV or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='Output file, defaults to stdout.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        stream = self.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+
+        # iterator() streams rows from a server side cursor instead of loading the whole table
+        rows = (
+            Product.objects.order_by('id')
+            .values_list(*EXPORT_FIELDS)
+            .iterator(chunk_size=options['chunk_size'])
+        )
+
+        started = time.perf_counter()
+        count = 0
+        try:
+            if fmt == 'csv':
+                writer = csv.writer(stream)
+                writer.writerow(EXPORT_FIELDS)
+                for row in rows:
+                    writer.writerow([export_value(value) for value in row])
+                    count += 1
+            else:
+                for row in rows:
+                    record = dict(zip(EXPORT_FIELDS, (export_value(value) for value in row)))
+                    stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    count += 1
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        # Keep the summary off stdout when the export itself is written there
+        output = self.stderr if path == '-' else self.stdout
+        output.write(f'Exported {count} products in {elapsed:.2f}s ({rate:.0f} rows/s)')
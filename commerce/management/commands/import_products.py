@@ -0,0 +1,136 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from commerce.api.serializers import ProductSerializer
+from commerce.cache import catalog_cache
+from commerce.models import Product
+from commerce.pricing import reprice_pending_carts
+from commerce.search import search_index
+
+
+UPDATE_FIELDS = ['name', 'description', 'price', 'category', 'in_stock', 'stock', 'updated']
+
+# CSV has no null, export_products writes None as an empty cell (untracked stock)
+NULLABLE_FIELDS = {field.name for field in Product._meta.concrete_fields if field.null}
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield {key: None if value == '' and key in NULLABLE_FIELDS else value for key, value in row.items()}
+        return
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = 'Streams products from a CSV or JSON Lines file into the catalog in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, "-" reads from stdin.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--strict', action='store_true', help='Abort on the first invalid row.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        created = updated = invalid = 0
+        started = time.perf_counter()
+
+        try:
+            # Row numbers are 1 based and count data rows only
+            rows = enumerate(read_rows(stream, fmt), start=1)
+            for chunk in chunked(rows, batch_size):
+                new, changed, errors = self.validate_chunk(chunk)
+                for row_number, error in errors:
+                    if options['strict']:
+                        raise CommandError(f'Row {row_number}: {error}')
+                    self.stderr.write(f'Row {row_number} skipped: {error}')
+
+                # Each batch is its own transaction so a failure only loses the current batch
+                with transaction.atomic():
+                    Product.objects.bulk_create(new, batch_size=batch_size)
+                    Product.objects.bulk_update(changed, UPDATE_FIELDS, batch_size=batch_size)
+                # Pending carts holding an updated product follow its new price
+                if changed:
+                    reprice_pending_carts([product.pk for product in changed], batch_size)
+
+                created += len(new)
+                updated += len(changed)
+                invalid += len(errors)
+                if options['verbosity'] > 1:
+                    self.report(created, updated, invalid, started)
+        except json.JSONDecodeError as e:
+            raise CommandError(f'Invalid JSON line: {e}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+            # Bulk writes skip the model signals, so invalidate the derived data here
+            if created or updated:
+                catalog_cache.bump_version()
+                search_index.clear()
+
+        self.report(created, updated, invalid, started, style=self.style.SUCCESS)
+
+    def validate_chunk(self, chunk):
+        # One serializer instance validates the whole chunk with the same rules as the API
+        serializer = ProductSerializer()
+
+        # Rows that carry an id of an existing product update it instead of creating a new one
+        ids = [int(row['id']) for _, row in chunk if str(row.get('id') or '').isdigit()]
+        existing = Product.objects.in_bulk(ids)
+
+        new, changed, errors = [], [], []
+        now = timezone.now()
+        for row_number, row in chunk:
+            try:
+                data = serializer.run_validation(row)
+            except ValidationError as e:
+                errors.append((row_number, e.detail))
+                continue
+
+            pk = str(row.get('id') or '')
+            product = existing.get(int(pk)) if pk.isdigit() else None
+            if product is None:
+                new.append(Product(**data))
+                continue
+
+            for field, value in data.items():
+                setattr(product, field, value)
+            # bulk_update() does not run auto_now
+            product.updated = now
+            changed.append(product)
+
+        return new, changed, errors
+
+    def report(self, created, updated, invalid, started, style=None):
+        elapsed = time.perf_counter() - started
+        rate = (created + updated) / elapsed if elapsed else 0
+        message = (
+            f'{created} created, {updated} updated, {invalid} skipped '
+            f'in {elapsed:.2f}s ({rate:.0f} rows/s)'
+        )
+        self.stdout.write(style(message) if style else message)
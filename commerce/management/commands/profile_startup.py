@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from commerce.profiling import run_startup_profile
+from commerce.reporting import benchmark_metadata, write_results
+
+
+class Command(BaseCommand):
+    help = (
+        'Boots the project in fresh interpreters, like a new gunicorn worker, and reports the import time '
+        'of each package and how long django.setup(), the URLconf and the first requests take.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/schema/', help='Path requested once the project is loaded.')
+        parser.add_argument('--runs', type=int, default=3, help='Interpreters started, the median is reported.')
+        parser.add_argument(
+            '--schema-mode', choices=['cached', 'file', 'live'],
+            help='SCHEMA_MODE of the profiled interpreters, the configured one by default.',
+        )
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1.')
+
+        env = {'SCHEMA_MODE': options['schema_mode']} if options['schema_mode'] else None
+        try:
+            result = run_startup_profile(path=options['path'], runs=options['runs'], env=env)
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+
+        header = f"{'package':<28}{'modules':>9}{'import ms':>12}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        packages = sorted(result['packages'].items(), key=lambda item: item[1]['self_ms'], reverse=True)
+        for name, package in packages:
+            self.stdout.write(f"{name:<28}{package['modules']:>9}{package['self_ms']:>12.1f}")
+        self.stdout.write('')
+        for name, milliseconds in result['phases'].items():
+            self.stdout.write(f"{name:<28}{milliseconds:>21.1f}")
+        self.stdout.write(f"{'status of ' + options['path']:<28}{result['status']:>21}")
+
+        if options['output']:
+            metadata = benchmark_metadata(
+                **{key: options[key] for key in ('path', 'runs', 'schema_mode')}
+            )
+            write_results(options['output'], metadata, result)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
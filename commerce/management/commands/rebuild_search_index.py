@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from commerce.search import rebuild_search_index, use_postgres_search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product full text search index.'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_search_index()
+        elapsed = time.perf_counter() - started
+
+        backend = 'PostgreSQL GIN index' if use_postgres_search() else 'in-process inverted index'
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt the {backend} for {count} products in {elapsed:.2f}s'
+        ))
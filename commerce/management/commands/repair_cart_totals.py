@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from commerce.cache import bump_cart_version
+from commerce.models import Cart
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the stored subtotal and item_count of every cart from its items in keyset batches '
+        'and reports the carts whose stored values had drifted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only report the drift.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        checked = 0
+        drifted = []
+        last_pk = 0
+
+        while True:
+            ids = list(
+                Cart.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            last_pk = ids[-1]
+            checked += len(ids)
+
+            with transaction.atomic():
+                rows = Cart.objects.filter(pk__in=ids).order_by().with_totals().values_list(
+                    'pk', 'subtotal', 'item_count', 'annotated_total_price', 'annotated_items_count',
+                )
+                batch = [
+                    pk for pk, subtotal, item_count, total, count in rows
+                    if subtotal != (total or 0) or item_count != count
+                ]
+                if batch and not options['dry_run']:
+                    Cart.objects.filter(pk__in=batch).update_totals()
+                    # Cached cart ETags were computed from the drifted totals
+                    for pk in batch:
+                        transaction.on_commit(lambda pk=pk: bump_cart_version(pk))
+            drifted.extend(batch)
+
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Checked {checked} carts, {len(drifted)} drifted')
+
+        elapsed = time.perf_counter() - started
+        action = 'found' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} carts in {elapsed:.2f}s, {action} {len(drifted)} with drifted totals'
+        ))
+        if drifted:
+            sample = ', '.join(str(pk) for pk in drifted[:20])
+            more = f' and {len(drifted) - 20} more' if len(drifted) > 20 else ''
+            self.stdout.write(f'Drifted carts: {sample}{more}')
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from commerce.pricing import reprice_batches, stale_items
+
+
+class Command(BaseCommand):
+    help = (
+        'Brings the unit prices of pending cart items in line with the current product prices '
+        'in batches of carts, and updates their totals.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('products', nargs='*', type=int, help='Product ids, defaults to every product.')
+        parser.add_argument('--batch-size', type=int, default=None, help='Carts per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the stale items.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        product_ids = options['products'] or None
+
+        if options['dry_run']:
+            items = stale_items(product_ids)
+            self.stdout.write(
+                f'{items.count()} stale items in {items.values("cart").distinct().count()} pending carts'
+            )
+            return
+
+        started = time.perf_counter()
+        carts = items = 0
+        for batch_carts, batch_items in reprice_batches(product_ids, options['batch_size']):
+            carts += batch_carts
+            items += batch_items
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Repriced {items} items in {carts} carts')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Repriced {items} items in {carts} carts in {elapsed:.2f}s'))
@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-18 11:20
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+# Functional GIN index for the full text search in commerce/search.py, the
+# expression has to match product_search_vector() for the planner to use it.
+def search_index():
+    return GinIndex(
+        SearchVector('name', weight='A', config='english')
+        + SearchVector('description', weight='B', config='english'),
+        name='product_search_idx',
+    )
+
+
+def add_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.add_index(apps.get_model('commerce', 'Product'), search_index())
+
+
+def remove_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(apps.get_model('commerce', 'Product'), search_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
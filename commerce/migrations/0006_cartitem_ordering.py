@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 11:11
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0005_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='cartitem',
+            options={'ordering': ['id']},
+        ),
+    ]
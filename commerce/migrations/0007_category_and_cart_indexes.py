@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 11:39
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Upper
+
+
+# Category pages now match the code exactly, normalize any code saved in lower case
+def uppercase_categories(apps, schema_editor):
+    Product = apps.get_model('commerce', 'Product')
+    Product.objects.exclude(category=Upper('category')).update(category=Upper('category'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0006_cartitem_ordering'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(uppercase_categories, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['user', 'status', '-created'], name='cart_user_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', '-created', '-id'], name='product_category_created_idx'),
+        ),
+    ]
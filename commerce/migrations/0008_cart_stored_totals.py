@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 11:42
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+# Same statement as CartQuerySet.update_totals(), historical models have no custom querysets
+def backfill_totals(apps, schema_editor):
+    Cart = apps.get_model('commerce', 'Cart')
+    CartItem = apps.get_model('commerce', 'CartItem')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+
+    items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    subtotal = items.annotate(total=Sum(F('product__price') * F('quantity'), output_field=amount)).values('total')
+    item_count = items.annotate(count=Count('id')).values('count')
+    Cart.objects.update(
+        subtotal=Coalesce(Subquery(subtotal), Value(0), output_field=amount),
+        item_count=Coalesce(Subquery(item_count), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0007_category_and_cart_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-18 14:05
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+# Existing items are snapshotted at the current price, the one their carts were totalled with
+def snapshot_prices(apps, schema_editor):
+    CartItem = apps.get_model('commerce', 'CartItem')
+    Product = apps.get_model('commerce', 'Product')
+    CartItem.objects.update(unit_price=Subquery(Product.objects.filter(pk=OuterRef('product')).values('price')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0008_cart_stored_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.RunPython(snapshot_prices, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cartitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10),
+        ),
+    ]
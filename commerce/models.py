@@ -1,10 +1,59 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, connections, transaction, IntegrityError
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.db.models import Q, F, Sum, Count, OuterRef, Subquery, Value, Case, When
+from django.db.models.functions import Coalesce, Now
+
+from commerce.cache import bump_cart_version
 
 # Create your models here.
 
 
+class InsufficientStock(Exception):
+
+    def __init__(self, shortages):
+        # {product id: units available}
+        self.shortages = shortages
+        super().__init__(f'Insufficient stock for products {sorted(shortages)}')
+
+
+class ProductQuerySet(models.QuerySet):
+
+    # Takes {product id: quantity} out of stock. The product rows are locked in pk order so checkouts
+    # sharing products queue up instead of deadlocking, then every tracked product is decremented with
+    # one UPDATE. Raises InsufficientStock and changes nothing when a product is short.
+    # Returns the ids of the products that sold out.
+    def reserve(self, quantities):
+        with transaction.atomic(using=self.db, savepoint=False):
+            rows = list(
+                self.select_for_update().filter(pk__in=quantities).order_by('pk').values_list('pk', 'stock', 'in_stock')
+            )
+            shortages, tracked = {}, {}
+            for pk, stock, in_stock in rows:
+                if stock is None:
+                    if not in_stock:
+                        shortages[pk] = 0
+                elif stock < quantities[pk]:
+                    shortages[pk] = stock
+                else:
+                    tracked[pk] = quantities[pk]
+            # Deleted since the quantities were read
+            shortages.update(dict.fromkeys(quantities.keys() - {row[0] for row in rows}, 0))
+            if shortages:
+                raise InsufficientStock(shortages)
+
+            if tracked:
+                self.filter(pk__in=tracked).update(
+                    stock=F('stock') - Case(*[When(pk=pk, then=Value(quantity)) for pk, quantity in tracked.items()]),
+                    in_stock=Case(
+                        *[When(pk=pk, stock__gt=quantity, then=Value(True)) for pk, quantity in tracked.items()],
+                        default=Value(False),
+                    ),
+                )
+        return [pk for pk, stock, _ in rows if pk in tracked and stock == tracked[pk]]
+
+
 class Product(models.Model):
 
     CATEGORY_CHOICES = (
@@ -20,16 +69,107 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.CharField(max_length=2, choices=CATEGORY_CHOICES)
     in_stock = models.BooleanField(default=True)
+    # Units left for checkout, None when the product is not stock tracked and in_stock alone decides
+    stock = models.PositiveIntegerField(null=True, blank=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
-        ordering = ["-created"]
+        # The id breaks ties between products created at the same time so pages are stable
+        ordering = ["-created", "-id"]
+        indexes = [
+            models.Index(fields=["-created", "-id"], name="product_created_id_idx"),
+            # Category pages filter on the code and keep the default ordering, no sort step
+            models.Index(fields=["category", "-created", "-id"], name="product_category_created_idx"),
+            # The admin filters on the flag with the same ordering
+            models.Index(fields=["in_stock", "-created", "-id"], name="product_in_stock_created_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        product = super().from_db(db, field_names, values)
+        # The price stored in the database, see price_changed()
+        product._saved_price = product.__dict__.get('price')
+        return product
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._saved_price = self.price
+
+    # Whether the price differs from the one loaded or last saved, unknown prices count as changed
+    def price_changed(self):
+        saved = getattr(self, '_saved_price', None)
+        return saved is None or saved != self.price
+
+    # Whether a quantity can be added to a cart, checkout decides for good
+    def has_stock(self, quantity=1):
+        if self.stock is None:
+            return self.in_stock
+        return self.stock >= quantity
 
     def __str__(self):
         return self.name
     
 
+class CartQuerySet(models.QuerySet):
+
+    # Computes the cart totals from the items in SQL, the repair command compares them with the stored columns
+    def with_totals(self):
+        return self.annotate(
+            annotated_total_price=Sum(
+                F('items__unit_price') * F('items__quantity'),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+            annotated_items_count=Count('items'),
+        )
+
+    # Row locks the carts until the end of the transaction, in pk order so concurrent lockers cannot deadlock
+    def lock(self):
+        return list(self.select_for_update(of=('self',)).order_by('pk').values_list('pk', flat=True))
+
+    # Recomputes the stored subtotal and item_count of every cart in the queryset with one UPDATE.
+    # Called in the same transaction as each item write, see commerce/signals.py. The carts are
+    # locked first so the UPDATE reads the items committed by a concurrent writer of the same cart,
+    # lock=False is for callers that already hold the lock. touch=True also records the item write
+    # as activity in Cart.updated, which the cleanup_carts job reads.
+    def update_totals(self, lock=True, touch=False):
+        items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+        subtotal = items.annotate(
+            total=Sum(F('unit_price') * F('quantity'), output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+        ).values('total')
+        item_count = items.annotate(count=Count('id')).values('count')
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            if lock:
+                self.lock()
+            return self.update(
+                subtotal=Coalesce(Subquery(subtotal), Value(0), output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+                item_count=Coalesce(Subquery(item_count), Value(0)),
+                **({'updated': Now()} if touch else {}),
+            )
+
+    # Brings the unit prices of the items in these carts to the current product prices and updates
+    # their totals, one UPDATE each. Only pending carts are repriced, the others keep what was paid.
+    # Returns the number of repriced items, see commerce.pricing for the batched job.
+    def reprice(self):
+        with transaction.atomic(using=self.db, savepoint=False):
+            ids = self.filter(status='PENDING').lock()
+            price = Product.objects.filter(pk=OuterRef('product')).values('price')
+            repriced = CartItem.objects.using(self.db).filter(cart__in=ids).stale().update(unit_price=Subquery(price))
+            if repriced:
+                Cart.objects.using(self.db).filter(pk__in=ids).update_totals(lock=False)
+                # Updates send no signals, the cart ETags change once the new prices are committed
+                for cart_id in ids:
+                    transaction.on_commit(lambda cart_id=cart_id: bump_cart_version(cart_id), using=self.db)
+        return repriced
+
+    # Everything CartSerializer reads, in a fixed number of queries
+    def with_details(self):
+        return self.select_related('user').prefetch_related('items__product')
+
+
 class Cart(models.Model):
 
     STATUS_CHOICES = (
@@ -41,10 +181,22 @@ class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='carts')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
     created = models.DateTimeField(auto_now_add=True)
+    # Last change of the cart or its items, abandoned and old carts are found by it
+    updated = models.DateTimeField(auto_now=True)
+    # Maintained by CartQuerySet.update_totals() on every item write, never edited directly
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CartQuerySet.as_manager()
 
     # Adds constaints metadata to limit one pending cart per user
     class Meta:
         ordering = ["-created"]
+        indexes = [
+            models.Index(fields=["user", "status", "-created"], name="cart_user_status_created_idx"),
+            # Status filter of the admin changelist, which orders by -created then -pk
+            models.Index(fields=["status", "-created", "-id"], name="cart_status_created_idx"),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user'],
@@ -53,38 +205,150 @@ class Cart(models.Model):
             )
         ]
     
-    # Calculation for the total price of the items in a cart
+    # Total price of the items in a cart, stored so reads do not touch the items
     @property
     def total_price(self):
-        return sum(
-            item.product.price * item.quantity
-            for item in self.items.all()
-        )
+        return self.subtotal or 0
     
     # Number of items in a cart
     @property
     def items_count(self):
-        return self.items.count()
+        return self.item_count
     
 
     def __str__(self):
         return f"{self.user.username} - {self.status}"
     
 
+class CartItemQuerySet(models.QuerySet):
+
+    # Adds a product to a cart, or increments its quantity, and updates the cart totals in one transaction.
+    # The cart is locked before the item, the order every item write follows.
+    def add_to_cart(self, cart, product, quantity=1):
+        with transaction.atomic(using=self.db, savepoint=False):
+            Cart.objects.using(self.db).filter(pk=cart.pk).lock()
+            item = self._upsert(cart, product, quantity)
+            Cart.objects.using(self.db).filter(pk=cart.pk).update_totals(lock=False, touch=True)
+        return item
+
+    # Items whose unit price differs from the current product price
+    def stale(self):
+        return self.exclude(unit_price=F('product__price'))
+
+    # Inserts the item or increments its quantity in a single statement so concurrent adds never lose updates.
+    # The unit price is read from the products table by the same statement, re-adding a product refreshes it.
+    def _upsert(self, cart, product, quantity):
+        connection = connections[self.db]
+
+        if connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_columns_from_insert:
+            qn = connection.ops.quote_name
+            table = qn(self.model._meta.db_table)
+            products = qn(Product._meta.db_table)
+            sql = (
+                f"INSERT INTO {table} ({qn('cart_id')}, {qn('product_id')}, {qn('quantity')}, {qn('unit_price')}) "
+                f"SELECT %s, {qn('id')}, %s, {qn('price')} FROM {products} WHERE {qn('id')} = %s "
+                f"ON CONFLICT ({qn('cart_id')}, {qn('product_id')}) "
+                f"DO UPDATE SET {qn('quantity')} = {table}.{qn('quantity')} + excluded.{qn('quantity')}, "
+                f"{qn('unit_price')} = excluded.{qn('unit_price')} "
+                f"RETURNING {qn('id')}, {qn('quantity')}, {qn('unit_price')}"
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [cart.pk, quantity, product.pk])
+                row = cursor.fetchone()
+            if row is None:
+                raise Product.DoesNotExist('The product was deleted.')
+            pk, total, unit_price = row
+            # SQLite returns the price as a number
+            unit_price = Decimal(str(unit_price))
+            return self.model(pk=pk, cart=cart, product=product, quantity=total, unit_price=unit_price)
+
+        # Other databases increment with an F() expression and only insert when nothing was updated
+        items = self.filter(cart=cart, product=product)
+        if not items.update(quantity=models.F('quantity') + quantity, unit_price=product.price):
+            try:
+                with transaction.atomic(using=self.db):
+                    return self.create(cart=cart, product=product, quantity=quantity, unit_price=product.price)
+            except IntegrityError:
+                # Someone else created it simultaneously
+                items.update(quantity=models.F('quantity') + quantity, unit_price=product.price)
+        return items.get()
+
+
 class CartItem(models.Model):
 
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # Price of the product when it was added, paid carts keep it and pending carts are repriced
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
+
+    objects = CartItemQuerySet.as_manager()
     
     # Adds constaints metadata to limit one product per cart
     class Meta:
+        # Items are always listed in the order they were added
+        ordering = ["id"]
         constraints = [
             models.UniqueConstraint(
                 fields=["cart", "product"],
                 name="one_product_per_cart"
             )
         ]
+        indexes = [
+            models.Index(fields=["cart", "id"], name="cartitem_cart_id_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        item = super().from_db(db, field_names, values)
+        # The product the stored unit_price is the price of, see save()
+        item._priced_product_id = item.__dict__.get('product_id')
+        return item
+
+    # New items and items switched to another product take the current price of their product
+    def save(self, *args, **kwargs):
+        if self.unit_price is None or self.product_id != getattr(self, '_priced_product_id', self.product_id):
+            self.unit_price = self.product.price
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'unit_price'}
+        super().save(*args, **kwargs)
+        self._priced_product_id = self.product_id
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
+
+
+# Paid and cancelled carts moved out of commerce_cart by the cleanup_carts job, with the same ids
+class ArchivedCart(models.Model):
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_carts')
+    status = models.CharField(max_length=10, choices=Cart.STATUS_CHOICES)
+    created = models.DateTimeField()
+    updated = models.DateTimeField()
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+    item_count = models.PositiveIntegerField()
+    archived = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created"]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.status} (archived)"
+
+
+class ArchivedCartItem(models.Model):
+
+    id = models.BigIntegerField(primary_key=True)
+    cart = models.ForeignKey(ArchivedCart, on_delete=models.CASCADE, related_name='items')
+    # The name is kept so the history survives the product
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)
+    product_name = models.CharField(max_length=100)
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.product_name} x {self.quantity}"
@@ -0,0 +1,44 @@
+from itertools import islice
+
+from django.conf import settings
+
+from commerce.models import Cart, CartItem
+
+
+# Pending cart items whose unit price no longer matches the product
+def stale_items(product_ids=None):
+    items = CartItem.objects.filter(cart__status='PENDING').stale()
+    if product_ids is not None:
+        items = items.filter(product_id__in=product_ids)
+    return items
+
+
+# Reprices the pending carts holding one of the products (every product when None) in keyset
+# batches of carts. Each batch is one transaction with a fixed number of set based statements,
+# see CartQuerySet.reprice(), so a popular product never locks every cart it is in at once.
+# Yields the number of carts and items of each batch.
+def reprice_batches(product_ids=None, batch_size=None):
+    batch_size = batch_size or settings.CART_REPRICE_BATCH_SIZE
+    last_cart = 0
+    while True:
+        ids = list(
+            stale_items(product_ids)
+            .filter(cart_id__gt=last_cart)
+            .order_by('cart_id')
+            .values_list('cart_id', flat=True)
+            .distinct()[:batch_size]
+        )
+        if not ids:
+            return
+        last_cart = ids[-1]
+        yield len(ids), Cart.objects.filter(pk__in=ids).reprice()
+
+
+# Returns the number of repriced carts and items. max_batches stops early, the carts left are
+# repriced by the next run of the reprice_carts command.
+def reprice_pending_carts(product_ids=None, batch_size=None, max_batches=None):
+    carts = items = 0
+    for batch_carts, batch_items in islice(reprice_batches(product_ids, batch_size), max_batches):
+        carts += batch_carts
+        items += batch_items
+    return carts, items
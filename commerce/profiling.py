@@ -0,0 +1,82 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+# Runs in a fresh interpreter started with -X importtime, the way a new server worker boots
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urlconf = time.perf_counter()
+from django.conf import settings
+from django.test import Client
+host = next((host for host in settings.ALLOWED_HOSTS if host not in ('*', '') and host[0] != '.'), 'localhost')
+client = Client(HTTP_HOST=host)
+timings = {'setup_ms': setup - started, 'urlconf_ms': urlconf - setup}
+for name in ('first_request_ms', 'second_request_ms'):
+    before = time.perf_counter()
+    status = client.get(sys.argv[1]).status_code
+    timings[name] = time.perf_counter() - before
+timings = {name: round(seconds * 1000, 3) for name, seconds in timings.items()}
+print(json.dumps({'status': status, **timings}))
+"""
+
+STARTUP_PACKAGES = [
+    'commerce', 'account', 'SHOPLIFT', 'drf_spectacular', 'rest_framework_simplejwt', 'rest_framework', 'django',
+]
+
+
+# Sums the self time of every module -X importtime reports per top level package,
+# modules outside STARTUP_PACKAGES are grouped under "other"
+def parse_import_times(stderr):
+    packages = {name: {'modules': 0, 'self_ms': 0.0} for name in STARTUP_PACKAGES + ['other']}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue
+        package = name.strip().split('.')[0]
+        package = packages[package if package in packages else 'other']
+        package['modules'] += 1
+        package['self_ms'] += int(self_us) / 1000
+    for package in packages.values():
+        package['self_ms'] = round(package['self_ms'], 3)
+    return packages
+
+
+# Boots the project in new interpreters and reports the median import time per package and the
+# time django.setup(), loading the URLconf and the first two requests to path take
+def run_startup_profile(path='/api/schema/', runs=3, env=None):
+    samples = []
+    for _ in range(runs):
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT, path],
+            capture_output=True, text=True, env={**os.environ, **(env or {})},
+        )
+        if process.returncode:
+            raise RuntimeError(f'Startup failed:\n{process.stderr[-2000:]}')
+        samples.append((json.loads(process.stdout.strip().splitlines()[-1]), parse_import_times(process.stderr)))
+
+    timings, packages = samples[0]
+    return {
+        'status': timings['status'],
+        'phases': {
+            name: round(statistics.median(sample[0][name] for sample in samples), 3)
+            for name in timings if name != 'status'
+        },
+        'packages': {
+            name: {
+                'modules': package['modules'],
+                'self_ms': round(statistics.median(sample[1][name]['self_ms'] for sample in samples), 3),
+            }
+            for name, package in packages.items()
+        },
+    }
@@ -0,0 +1,39 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+import django
+from django.db import connection
+
+
+def percentile(samples, pct):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_metadata(**options):
+    return {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'options': options,
+    }
+
+
+def write_results(path, metadata, results):
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump({'meta': metadata, 'results': results}, handle, indent=2, sort_keys=True)
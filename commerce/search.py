@@ -0,0 +1,177 @@
+import bisect
+import re
+import threading
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+
+from commerce.models import Product
+
+
+SEARCH_CONFIG = 'english'
+SEARCH_INDEX_NAME = 'product_search_idx'
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Name matches rank above description matches
+NAME_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+# Best matches the fallback search returns, its ranking is one CASE branch per product
+FALLBACK_MAX_RESULTS = 200
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+# Must stay identical to the expression of the GIN index so PostgreSQL can use it
+def product_search_vector():
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def use_postgres_search():
+    return connection.vendor == 'postgresql'
+
+
+def postgres_search(queryset, terms):
+    # Every term is matched as a prefix so results show up while the user is still typing
+    raw_query = ' & '.join(f'{token}:*' for token in terms)
+    query = SearchQuery(raw_query, search_type='raw', config=SEARCH_CONFIG)
+    vector = product_search_vector()
+    return (
+        queryset.annotate(search=vector, search_rank=SearchRank(vector, query))
+        .filter(search=query)
+        .order_by('-search_rank', '-created', '-id')
+    )
+
+
+# In-process inverted index used when the database has no full text search (SQLite test runs)
+class InvertedIndex:
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)
+        self._documents = {}
+        self._tokens = []
+        self._built = False
+
+    def _index(self, product_id, name, description):
+        weights = defaultdict(int)
+        for token in tokenize(name):
+            weights[token] += NAME_WEIGHT
+        for token in tokenize(description):
+            weights[token] += DESCRIPTION_WEIGHT
+
+        self._documents[product_id] = weights
+        for token, weight in weights.items():
+            if token not in self._postings:
+                bisect.insort(self._tokens, token)
+            self._postings[token][product_id] = weight
+
+    def _remove(self, product_id):
+        for token in self._documents.pop(product_id, {}):
+            postings = self._postings[token]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+                del self._tokens[bisect.bisect_left(self._tokens, token)]
+
+    def rebuild(self):
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._tokens = []
+            for product_id, name, description in Product.objects.values_list('id', 'name', 'description').iterator():
+                self._index(product_id, name, description)
+            self._built = True
+            return len(self._documents)
+
+    def update(self, product):
+        with self._lock:
+            if not self._built:
+                return
+            self._remove(product.pk)
+            self._index(product.pk, product.name, product.description)
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._built:
+                self._remove(product_id)
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._tokens = []
+            self._built = False
+
+    def _prefix_matches(self, term):
+        scores = defaultdict(int)
+        start = bisect.bisect_left(self._tokens, term)
+        for token in self._tokens[start:]:
+            if not token.startswith(term):
+                break
+            for product_id, weight in self._postings[token].items():
+                scores[product_id] = max(scores[product_id], weight)
+        return scores
+
+    # Returns product ids matching every term, best match first
+    def search(self, terms):
+        with self._lock:
+            if not self._built:
+                self.rebuild()
+
+            scores = None
+            for term in terms:
+                matches = self._prefix_matches(term)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {
+                        product_id: score + matches[product_id]
+                        for product_id, score in scores.items()
+                        if product_id in matches
+                    }
+                if not scores:
+                    return []
+
+        return sorted(scores, key=lambda product_id: (-scores[product_id], -product_id))
+
+
+search_index = InvertedIndex()
+
+
+def fallback_search(queryset, terms):
+    ranked_ids = search_index.search(terms)[:FALLBACK_MAX_RESULTS]
+    if not ranked_ids:
+        return queryset.none()
+
+    rank = Case(
+        *[When(pk=product_id, then=Value(position)) for position, product_id in enumerate(ranked_ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ranked_ids).annotate(search_rank=rank).order_by('search_rank')
+
+
+def search_products(queryset, text):
+    terms = tokenize(text)
+    if not terms:
+        return queryset
+    if use_postgres_search():
+        return postgres_search(queryset, terms)
+    return fallback_search(queryset, terms)
+
+
+def rebuild_search_index():
+    if use_postgres_search():
+        with connection.cursor() as cursor:
+            cursor.execute(f'REINDEX INDEX {SEARCH_INDEX_NAME}')
+            cursor.execute('ANALYZE commerce_product')
+        return Product.objects.count()
+    return search_index.rebuild()
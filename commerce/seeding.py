@@ -0,0 +1,120 @@
+import random
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+
+from commerce.cache import catalog_cache
+from commerce.models import Cart, CartItem, Product
+from commerce.search import search_index
+
+
+BENCHMARK_PASSWORD = 'benchmark-password-123'
+
+WORDS = [
+    'classic', 'linen', 'cotton', 'leather', 'smart', 'running', 'summer', 'winter',
+    'slim', 'wireless', 'travel', 'vintage', 'sport', 'casual', 'premium', 'mini',
+]
+NOUNS = {
+    'CL': ['shirt', 'jacket', 'hoodie', 'dress'],
+    'AC': ['belt', 'wallet', 'cap', 'scarf'],
+    'FW': ['sneakers', 'boots', 'sandals', 'loafers'],
+    'GA': ['watch', 'earbuds', 'speaker', 'charger'],
+    'EX': ['sticker', 'gift card', 'keychain', 'poster'],
+}
+
+
+@dataclass
+class Dataset:
+    users: list
+    admin: User
+    product_ids: list
+    pending_carts: dict
+    categories: list = field(default_factory=list)
+
+
+# Seeds a catalog, users and carts with bulk inserts, the same seed always produces the same data
+def seed_dataset(products=1000, users=50, carts_per_user=5, items_per_cart=5, seed=42, batch_size=1000):
+    rng = random.Random(seed)
+    categories = [code for code, _ in Product.CATEGORY_CHOICES]
+
+    Product.objects.bulk_create(
+        [
+            Product(
+                name=f'{rng.choice(WORDS).title()} {rng.choice(NOUNS[category])} {number}',
+                description=' '.join(rng.choices(WORDS, k=12)),
+                price=Decimal(rng.randint(100, 50000)) / 100,
+                category=category,
+                in_stock=rng.random() > 0.1,
+            )
+            for number, category in ((number, rng.choice(categories)) for number in range(products))
+        ],
+        batch_size=batch_size,
+    )
+    # Bulk inserts skip the Product signals
+    catalog_cache.bump_version()
+    search_index.clear()
+    prices = dict(Product.objects.values_list('id', 'price'))
+    product_ids = list(prices)
+
+    # Hashing once keeps seeding fast, every user shares the password
+    password = make_password(BENCHMARK_PASSWORD)
+    User.objects.bulk_create(
+        [User(username=f'bench-user-{number}', email=f'bench-user-{number}@example.com', password=password) for number in range(users)],
+        batch_size=batch_size,
+    )
+    seeded_users = list(User.objects.filter(username__startswith='bench-user-').order_by('id'))
+    admin = User.objects.create_user(username='bench-admin', password=BENCHMARK_PASSWORD, is_staff=True)
+
+    carts = []
+    for user in seeded_users:
+        carts.append(Cart(user=user, status='PENDING'))
+        carts.extend(Cart(user=user, status=rng.choice(['PAID', 'CANCELLED'])) for _ in range(max(carts_per_user - 1, 0)))
+    Cart.objects.bulk_create(carts, batch_size=batch_size)
+
+    carts = Cart.objects.filter(user__in=seeded_users).values_list('id', 'user_id', 'status')
+    pending_carts = {}
+    items = []
+    for cart_id, user_id, status in carts.iterator():
+        if status == 'PENDING':
+            pending_carts[user_id] = cart_id
+        for product_id in rng.sample(product_ids, min(items_per_cart, len(product_ids))):
+            items.append(CartItem(
+                cart_id=cart_id, product_id=product_id, quantity=rng.randint(1, 5), unit_price=prices[product_id],
+            ))
+        if len(items) >= batch_size:
+            CartItem.objects.bulk_create(items, batch_size=batch_size)
+            items = []
+    CartItem.objects.bulk_create(items, batch_size=batch_size)
+    # Bulk inserts send no signals
+    Cart.objects.filter(user__in=seeded_users).update_totals()
+
+    return Dataset(
+        users=seeded_users,
+        admin=admin,
+        product_ids=product_ids,
+        pending_carts=pending_carts,
+        categories=categories,
+    )
+
+
+# Pending carts for the checkout benchmark, every cart holds a few of the same hot products in a
+# random order so concurrent checkouts compete for the same rows
+def seed_checkouts(run, checkouts, skus=5, stock=100, items_per_cart=3, seed=42):
+    rng = random.Random(seed)
+    products = Product.objects.bulk_create([
+        Product(name=f'Hot product {run} {number}', price=Decimal('10.00'), category='GA', stock=stock)
+        for number in range(skus)
+    ])
+    # Both supported databases return the primary keys of bulk inserts
+    users = User.objects.bulk_create([User(username=f'bench-checkout-{run}-{number}') for number in range(checkouts)])
+    carts = Cart.objects.bulk_create([Cart(user=user, status='PENDING') for user in users])
+
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product=product, quantity=rng.randint(1, 3), unit_price=product.price)
+        for cart in carts
+        for product in rng.sample(products, min(items_per_cart, len(products)))
+    ])
+    Cart.objects.filter(pk__in=[cart.pk for cart in carts]).update_totals()
+    return carts, products
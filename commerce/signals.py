@@ -0,0 +1,125 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from commerce.cache import bump_cart_version, catalog_cache, clear_pending_cart_id
+from commerce.models import Cart, CartItem, Product
+from commerce.pricing import reprice_pending_carts
+from commerce.search import search_index
+
+
+# Any product change (API, admin or shell) invalidates the cached catalog pages.
+# Versions are bumped after the commit so no reader can cache the old rows under the new version.
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_cache(sender, **kwargs):
+    transaction.on_commit(catalog_cache.bump_version)
+
+
+# Pending carts follow the product prices. A price change reprices one batch of carts after the commit,
+# the request saving the product never waits for a whole sweep, the reprice_carts job does the rest.
+@receiver(post_save, sender=Product)
+def reprice_pending_carts_for_product(sender, instance, created, **kwargs):
+    if not created and instance.price_changed():
+        product_id = instance.pk
+        transaction.on_commit(lambda: reprice_pending_carts([product_id], max_batches=1))
+
+
+# Keeps the in-process search index in line with the products table
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    search_index.update(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search_index.remove(instance.pk)
+
+
+# Deletes of a whole queryset of carts (cleanup_carts, admin actions) leave the cart versions and
+# cached pending cart ids to their caller, which handles the batch at once
+def deleted_in_bulk(origin):
+    return isinstance(origin, QuerySet)
+
+
+# Changes the cart ETag served by the cart endpoints
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def invalidate_cart_version(sender, instance, origin=None, **kwargs):
+    if deleted_in_bulk(origin):
+        return
+    cart_id = instance.pk
+    transaction.on_commit(lambda: bump_cart_version(cart_id))
+
+
+# The cached pending cart id is dropped as soon as the cart stops being pending
+@receiver(post_save, sender=Cart)
+def invalidate_pending_cart(sender, instance, created, **kwargs):
+    if instance.status != 'PENDING':
+        user_id = instance.user_id
+        transaction.on_commit(lambda: clear_pending_cart_id(user_id))
+
+
+@receiver(post_delete, sender=Cart)
+def forget_pending_cart(sender, instance, origin=None, **kwargs):
+    if instance.status == 'PENDING' and not deleted_in_bulk(origin):
+        user_id = instance.user_id
+        transaction.on_commit(lambda: clear_pending_cart_id(user_id))
+
+
+# Item deletes started by something else than the item itself: querysets of items (bulk removals,
+# admin actions) and cascades from products or users. The carts going away with their items need nothing.
+def deleted_with_others(instance, origin):
+    return origin is not None and origin is not instance and not (
+        isinstance(origin, Cart) or getattr(origin, 'model', None) is Cart
+    )
+
+
+def update_carts_after_delete(cart_ids, using):
+    if not cart_ids:
+        return
+    Cart.objects.using(using).filter(pk__in=cart_ids).update_totals(touch=True)
+    for cart_id in cart_ids:
+        bump_cart_version(cart_id)
+
+
+# Such deletes update the totals and versions once per cart after the commit, not once per item.
+# The carts are collected on the object whose delete() started it, so they live as long as the call.
+@receiver(pre_delete, sender=CartItem)
+def collect_carts_of_deleted_items(sender, instance, origin=None, using=None, **kwargs):
+    if not deleted_with_others(instance, origin):
+        return
+    cart_ids = origin.__dict__.get('_deleted_item_carts')
+    if cart_ids is None:
+        cart_ids = origin._deleted_item_carts = set()
+
+        def update():
+            origin.__dict__.pop('_deleted_item_carts', None)
+            update_carts_after_delete(cart_ids, using)
+
+        transaction.on_commit(update, using=using)
+    cart_ids.add(instance.cart_id)
+
+
+# For callers that update the totals of the carts in the same transaction anyway
+def skip_cart_updates_after_delete(origin):
+    origin.__dict__.get('_deleted_item_carts', set()).clear()
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def invalidate_cart_item_version(sender, instance, origin=None, **kwargs):
+    if origin is not None and origin is not instance:
+        return
+    cart_id = instance.cart_id
+    transaction.on_commit(lambda: bump_cart_version(cart_id))
+
+
+# Stored cart totals follow every item write and delete in the same transaction (admin, shell and API)
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def update_cart_totals(sender, instance, origin=None, **kwargs):
+    if origin is not None and origin is not instance:
+        return
+    Cart.objects.filter(pk=instance.cart_id).update_totals(touch=True)
@@ -1,3 +1,1603 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.test import (
+    AsyncRequestFactory, RequestFactory, SimpleTestCase, TransactionTestCase, override_settings, skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from drf_spectacular.generators import SchemaGenerator
+from drf_spectacular.renderers import OpenApiYamlRenderer
+from rest_framework.test import APIClient, APITestCase
+
+from SHOPLIFT.middleware import DatabaseRoutingMiddleware, QueryBudgetExceeded, pool_stats
+from SHOPLIFT.routers import PrimaryReplicaRouter, sticky_key
+from SHOPLIFT.schema import PrecomputedSchemaView
+from account.api import urls as account_urls
+from account.api.views import AsyncRegister
+from commerce.api import urls as commerce_urls
+from commerce.api import async_views, views
+from commerce.api.renderers import FastJSONRenderer
+from commerce.benchmarks import run_checkout_benchmark
+from commerce.checks import check_catalog_cache, check_replica_cache
+from commerce.cache import CATALOG_LAST_MODIFIED_KEY, cart_version_key, catalog_cache, get_cart_version, get_pending_cart_id, set_pending_cart_id
+from commerce.models import ArchivedCart, ArchivedCartItem, Cart, CartItem, Product
+from commerce.search import search_index, use_postgres_search
+
+
+# Fails any request that runs more queries than its budget in settings.QUERY_BUDGETS
+@override_settings(QUERY_BUDGET_STRICT=True)
+class CommerceTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='jude', password='password123@')
+        self.client.force_authenticate(user=self.user)
+
+    def make_product(self, name='Shirt', price='10.00', category='CL', **kwargs):
+        return Product.objects.create(name=name, price=Decimal(price), category=category, **kwargs)
+
+    def make_cart(self, status='PAID', items=()):
+        cart = Cart.objects.create(user=self.user, status=status)
+        for product, quantity in items:
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        return cart
+
+
+class CartTotalsTests(CommerceTestCase):
+
+    def test_stored_totals_follow_every_item_write(self):
+        shirt = self.make_product(price='10.50')
+        shoe = self.make_product(name='Shoe', price='25.00', category='FW')
+        cart = self.make_cart(status='PENDING', items=[(shirt, 2), (shoe, 1)])
+        empty = self.make_cart(status='CANCELLED')
+
+        def totals(cart):
+            cart.refresh_from_db()
+            return cart.total_price, cart.items_count
+
+        self.assertEqual(totals(cart), (Decimal('46.00'), 2))
+        self.assertEqual(totals(empty), (0, 0))
+        computed = Cart.objects.with_totals().get(pk=cart.pk)
+        self.assertEqual((computed.annotated_total_price, computed.annotated_items_count), (Decimal('46.00'), 2))
+
+        item = cart.items.get(product=shoe)
+        self.client.patch(reverse('item-list-detail', args=[item.pk]), {'quantity': 3})
+        self.assertEqual(totals(cart), (Decimal('96.00'), 2))
+
+        self.client.post(reverse('item-list', args=[cart.pk]), {'product': shirt.pk, 'quantity': 1})
+        self.assertEqual(totals(cart), (Decimal('106.50'), 2))
+
+        self.client.delete(reverse('item-list-detail', args=[item.pk]))
+        self.assertEqual(totals(cart), (Decimal('31.50'), 1))
+
+        shirt.price = Decimal('20.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            shirt.save()
+        self.assertEqual(totals(cart), (Decimal('60.00'), 1))
+
+        # Cascades update each cart once after the commit
+        with self.captureOnCommitCallbacks(execute=True):
+            shirt.delete()
+        self.assertEqual(totals(cart), (0, 0))
+
+    def test_bulk_and_cascading_deletes_update_each_cart_once(self):
+        shirt = self.make_product(price='10.00')
+        shoe = self.make_product(name='Shoe', price='25.00', category='FW')
+        cart = self.make_cart(status='PENDING', items=[(shirt, 2), (shoe, 1)])
+        other = self.make_cart(status='PAID', items=[(shirt, 1), (shoe, 3)])
+        versions = [get_cart_version(cart.pk), get_cart_version(other.pk)]
+
+        # The DELETE and its row lookup, then one lock and one UPDATE for both carts
+        with self.assertNumQueries(4), self.captureOnCommitCallbacks(execute=True):
+            CartItem.objects.filter(product=shoe).delete()
+        cart.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((cart.subtotal, other.subtotal), (Decimal('20.00'), Decimal('10.00')))
+        self.assertNotEqual([get_cart_version(cart.pk), get_cart_version(other.pk)], versions)
+
+        # Deleting the user takes the carts along, nothing is left to update
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertFalse(Cart.objects.exists())
+
+    def test_reading_carts_does_not_touch_the_items(self):
+        product = self.make_product()
+        cart = self.make_cart(items=[(product, 2)])
+        with self.assertNumQueries(1):
+            cart = Cart.objects.get(pk=cart.pk)
+            self.assertEqual((cart.total_price, cart.items_count), (Decimal('20.00'), 1))
+
+    def test_repair_command_reports_and_fixes_drift(self):
+        product = self.make_product()
+        carts = [self.make_cart(items=[(product, 1)]) for _ in range(3)]
+        Cart.objects.filter(pk=carts[1].pk).update(subtotal=Decimal('99.00'))
+
+        out = StringIO()
+        call_command('repair_cart_totals', '--dry-run', '--batch-size', '2', stdout=out)
+        self.assertIn('found 1 with drifted totals', out.getvalue())
+        self.assertIn(f'Drifted carts: {carts[1].pk}', out.getvalue())
+        self.assertEqual(Cart.objects.get(pk=carts[1].pk).subtotal, Decimal('99.00'))
+
+        versions = [get_cart_version(cart.pk) for cart in carts]
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('repair_cart_totals', stdout=out)
+        self.assertIn('repaired 1 with drifted totals', out.getvalue())
+        self.assertEqual(Cart.objects.get(pk=carts[1].pk).subtotal, Decimal('10.00'))
+        # Only the repaired cart gets a new ETag
+        self.assertEqual([get_cart_version(cart.pk) != version for cart, version in zip(carts, versions)],
+                         [False, True, False])
+
+    def test_cart_list_query_count_does_not_grow_with_carts(self):
+        product = self.make_product()
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('cart-list'))
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+
+        self.make_cart(items=[(product, 1)])
+        baseline = count_queries()
+
+        for _ in range(5):
+            self.make_cart(items=[(product, 3)])
+        self.assertEqual(count_queries(), baseline)
+
+        response = self.client.get(reverse('cart-list'))
+        totals = sorted(cart['total_price'] for cart in response.data)
+        self.assertEqual(totals, [Decimal('10.00')] + [Decimal('30.00')] * 5)
+        self.assertTrue(all(cart['items_count'] == 1 for cart in response.data))
+
+
+class PriceSnapshotTests(CommerceTestCase):
+
+    def change_price(self, product, price):
+        product.price = Decimal(price)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+    def test_paid_carts_keep_the_price_they_were_added_at(self):
+        product = self.make_product(price='10.00')
+        paid = self.make_cart(status='PAID', items=[(product, 2)])
+        pending = self.make_cart(status='PENDING', items=[(product, 1)])
+
+        self.change_price(product, '12.50')
+
+        response = self.client.get(reverse('cart-detail', args=[paid.pk]))
+        self.assertEqual(response.data['items'][0]['product_price'], '10.00')
+        self.assertEqual(response.data['total_price'], Decimal('20.00'))
+
+        response = self.client.get(reverse('cart-detail', args=[pending.pk]))
+        self.assertEqual(response.data['items'][0]['product_price'], '12.50')
+        self.assertEqual(response.data['total_price'], Decimal('12.50'))
+
+    def test_adding_a_product_again_takes_the_current_price(self):
+        product = self.make_product(price='10.00')
+        cart = self.make_cart(status='PENDING', items=[(product, 1)])
+        # A price change whose repricing has not run yet
+        Product.objects.filter(pk=product.pk).update(price=Decimal('11.00'))
+
+        response = self.client.post(reverse('item-list', args=[cart.pk]), {'product': product.pk, 'quantity': 1})
+        self.assertEqual(response.data['product_price'], '11.00')
+        cart.refresh_from_db()
+        self.assertEqual(cart.subtotal, Decimal('22.00'))
+
+        response = self.client.post(reverse('item-bulk', args=[cart.pk]), [{'product': product.pk, 'quantity': 3}], format='json')
+        self.assertEqual(response.data['items'][0]['product_price'], '11.00')
+
+    def test_switching_the_product_takes_its_price(self):
+        shirt = self.make_product(price='10.00')
+        shoe = self.make_product(name='Shoe', price='25.00', category='FW')
+        cart = self.make_cart(status='PENDING', items=[(shirt, 2)])
+        item = cart.items.get()
+
+        response = self.client.patch(reverse('item-list-detail', args=[item.pk]), {'product': shoe.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['product_price'], '25.00')
+        item.refresh_from_db()
+        self.assertEqual(item.unit_price, Decimal('25.00'))
+        cart.refresh_from_db()
+        self.assertEqual(cart.subtotal, Decimal('50.00'))
+
+        # Other changes keep the price the item was added at
+        Product.objects.filter(pk=shoe.pk).update(price=Decimal('30.00'))
+        self.client.patch(reverse('item-list-detail', args=[item.pk]), {'quantity': 1})
+        item.refresh_from_db()
+        self.assertEqual(item.unit_price, Decimal('25.00'))
+
+    def test_only_price_changes_reprice_and_one_batch_inline(self):
+        admin = User.objects.create_superuser(username='admin', password='password123@')
+        self.client.force_authenticate(user=admin)
+        product = self.make_product(price='10.00')
+        carts = []
+        for number in range(3):
+            cart = Cart.objects.create(user=User.objects.create_user(username=f'user-{number}'), status='PENDING')
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            carts.append(cart)
+        url = reverse('product-detail', args=[product.pk])
+
+        # The object lookup and the UPDATE, no stale cart scan
+        with self.assertNumQueries(2), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.patch(url, {'name': 'Renamed', 'stock': 4}).status_code, 200)
+
+        with self.settings(CART_REPRICE_BATCH_SIZE=2), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.patch(url, {'price': '12.00'}).status_code, 200)
+        subtotals = [Cart.objects.get(pk=cart.pk).subtotal for cart in carts]
+        self.assertEqual(subtotals, [Decimal('12.00'), Decimal('12.00'), Decimal('10.00')])
+
+        # The job reprices the carts left
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reprice_carts', stdout=StringIO())
+        self.assertEqual(Cart.objects.get(pk=carts[2].pk).subtotal, Decimal('12.00'))
+
+    def test_reprice_command_updates_pending_carts_in_batches(self):
+        products = [self.make_product(name=f'Shirt {number}', price='10.00') for number in range(2)]
+        carts = []
+        for number in range(5):
+            user = User.objects.create_user(username=f'user-{number}')
+            cart = Cart.objects.create(user=user, status='PENDING')
+            for product in products:
+                CartItem.objects.create(cart=cart, product=product, quantity=number + 1)
+            carts.append(cart)
+        paid = self.make_cart(status='PAID', items=[(products[0], 1)])
+        Product.objects.update(price=Decimal('20.00'))
+
+        out = StringIO()
+        call_command('reprice_carts', '--dry-run', stdout=out)
+        self.assertIn('10 stale items in 5 pending carts', out.getvalue())
+
+        versions = [get_cart_version(cart.pk) for cart in carts + [paid]]
+        out = StringIO()
+        # A lock, the item UPDATE and the totals UPDATE per batch, plus the batch lookups
+        with self.assertNumQueries(3 * 3 + 4), self.captureOnCommitCallbacks(execute=True):
+            call_command('reprice_carts', '--batch-size', '2', stdout=out)
+        self.assertIn('Repriced 10 items in 5 carts', out.getvalue())
+        # The repriced carts get new ETags once committed
+        changed = [get_cart_version(cart.pk) != version for cart, version in zip(carts + [paid], versions)]
+        self.assertEqual(changed, [True] * 5 + [False])
+
+        for number, cart in enumerate(carts):
+            cart.refresh_from_db()
+            self.assertEqual(cart.subtotal, Decimal('40.00') * (number + 1))
+        paid.refresh_from_db()
+        self.assertEqual(paid.subtotal, Decimal('10.00'))
+        self.assertFalse(CartItem.objects.filter(cart__in=carts).stale().exists())
+
+    def test_import_reprices_pending_carts(self):
+        product = self.make_product(price='10.00')
+        cart = self.make_cart(status='PENDING', items=[(product, 2)])
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            f.write(json.dumps({'id': product.pk, 'name': 'Shirt', 'price': '15.00', 'category': 'CL'}) + '\n')
+        self.addCleanup(os.remove, f.name)
+
+        call_command('import_products', f.name, stdout=StringIO())
+        cart.refresh_from_db()
+        self.assertEqual(cart.subtotal, Decimal('30.00'))
+        self.assertEqual(cart.items.get().unit_price, Decimal('15.00'))
+
+
+class CheckoutTests(CommerceTestCase):
+
+    def checkout(self, cart):
+        return self.client.post(reverse('checkout', args=[cart.pk]))
+
+    def test_checkout_takes_the_items_out_of_stock(self):
+        shirt = self.make_product(price='10.00', stock=5)
+        cap = self.make_product(name='Cap', price='4.00', category='AC', stock=2)
+        poster = self.make_product(name='Poster', price='1.00', category='EX')
+        cart = self.make_cart(status='PENDING', items=[(shirt, 2), (cap, 2), (poster, 3)])
+
+        response = self.checkout(cart)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'PAID')
+        self.assertEqual(response.data['total_price'], Decimal('31.00'))
+
+        stock = dict(Product.objects.values_list('name', 'stock'))
+        self.assertEqual(stock, {'Shirt': 3, 'Cap': 0, 'Poster': None})
+        self.assertEqual(
+            dict(Product.objects.values_list('name', 'in_stock')), {'Shirt': True, 'Cap': False, 'Poster': True},
+        )
+
+        # A paid cart cannot be checked out again
+        self.assertEqual(self.checkout(cart).status_code, 400)
+        self.assertEqual(Product.objects.get(pk=shirt.pk).stock, 3)
+
+    def test_items_of_a_cart_paid_meanwhile_cannot_change(self):
+        shirt = self.make_product(stock=5)
+        cart = self.make_cart(status='PENDING', items=[(shirt, 2)])
+        item = cart.items.get()
+        url = reverse('item-list-detail', args=[item.pk])
+        get_object = views.CartItemDetailAV.get_object
+
+        # The checkout commits after the item and its cart were read
+        def read_then_checkout(view):
+            item = get_object(view)
+            self.assertEqual(self.checkout(cart).status_code, 200)
+            return item
+
+        with patch.object(views.CartItemDetailAV, 'get_object', read_then_checkout):
+            self.assertEqual(self.client.patch(url, {'quantity': 1}).status_code, 400)
+        Cart.objects.filter(pk=cart.pk).update(status='PENDING')
+        with patch.object(views.CartItemDetailAV, 'get_object', read_then_checkout):
+            self.assertEqual(self.client.delete(url).status_code, 400)
+
+        self.assertEqual(list(cart.items.values_list('quantity', flat=True)), [2])
+        self.assertEqual(self.client.post(reverse('item-list', args=[cart.pk]), {'product': shirt.pk}).status_code, 400)
+        self.assertEqual(Cart.objects.get(pk=cart.pk).item_count, 1)
+
+    def test_short_stock_changes_nothing(self):
+        shirt = self.make_product(stock=5)
+        cap = self.make_product(name='Cap', category='AC', stock=1)
+        cart = self.make_cart(status='PENDING', items=[(shirt, 2), (cap, 1)])
+        Product.objects.filter(pk=cap.pk).update(stock=0, in_stock=False)
+
+        response = self.checkout(cart)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'stock': [f'Only 0 left of product "{cap.pk}".']})
+        cart.refresh_from_db()
+        self.assertEqual(cart.status, 'PENDING')
+        self.assertEqual(Product.objects.get(pk=shirt.pk).stock, 5)
+
+    def test_empty_and_foreign_carts(self):
+        self.assertEqual(self.checkout(self.make_cart(status='PENDING')).status_code, 400)
+        other = User.objects.create_user(username='other')
+        cart = Cart.objects.create(user=other, status='PENDING')
+        self.assertEqual(self.checkout(cart).status_code, 404)
+
+    def test_out_of_stock_products_cannot_be_added(self):
+        cart = self.make_cart(status='PENDING')
+        url = reverse('item-list', args=[cart.pk])
+        sold_out = self.make_product(in_stock=False)
+        limited = self.make_product(name='Cap', category='AC', stock=3)
+
+        self.assertEqual(self.client.post(url, {'product': sold_out.pk, 'quantity': 1}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'product': limited.pk, 'quantity': 2}).status_code, 201)
+        # The increment that would exceed the stock is rolled back
+        self.assertEqual(self.client.post(url, {'product': limited.pk, 'quantity': 2}).status_code, 400)
+        self.assertEqual(cart.items.get().quantity, 2)
+
+        response = self.client.post(
+            reverse('item-bulk', args=[cart.pk]), [{'product': limited.pk, 'quantity': 4}], format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+        item = cart.items.get()
+        self.assertEqual(self.client.patch(reverse('item-list-detail', args=[item.pk]), {'quantity': 4}).status_code, 400)
+        self.assertEqual(self.client.patch(reverse('item-list-detail', args=[item.pk]), {'quantity': 1}).status_code, 200)
+
+    def test_stock_updates_keep_the_flag_in_line(self):
+        admin = User.objects.create_user(username='admin', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        product = self.make_product(stock=2)
+        response = self.client.patch(reverse('product-detail', args=[product.pk]), {'stock': 0})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['in_stock'])
+
+
+class CartCleanupTests(CommerceTestCase):
+
+    def make_old_cart(self, days, status, items=()):
+        user = User.objects.create_user(username=f'user-{User.objects.count()}')
+        cart = Cart.objects.create(user=user, status=status)
+        for product, quantity in items:
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        Cart.objects.filter(pk=cart.pk).update(updated=timezone.now() - timedelta(days=days))
+        return cart
+
+    def cleanup(self, *args):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('cleanup_carts', '--pending-days', '30', '--history-days', '365', *args, stdout=out)
+        return out.getvalue()
+
+    def test_abandoned_and_historical_carts(self):
+        product = self.make_product()
+        abandoned = [self.make_old_cart(40, 'PENDING', [(product, 1)]) for _ in range(3)]
+        active = self.make_old_cart(10, 'PENDING', [(product, 1)])
+        old_paid = [self.make_old_cart(400, 'PAID', [(product, 2)]), self.make_old_cart(400, 'CANCELLED')]
+        recent_paid = self.make_old_cart(100, 'PAID', [(product, 1)])
+
+        self.assertEqual(self.cleanup('--dry-run'), '3 abandoned carts\n2 historical carts\n')
+
+        output = self.cleanup('--batch-size', '2')
+        self.assertIn('3 abandoned carts deleted with 3 items', output)
+        self.assertIn('2 historical carts archived with 1 items', output)
+        self.assertIn('rows/s', output)
+
+        self.assertEqual(set(Cart.objects.values_list('pk', flat=True)), {active.pk, recent_paid.pk})
+        self.assertEqual(CartItem.objects.count(), 2)
+        archived = ArchivedCart.objects.get(pk=old_paid[0].pk)
+        self.assertEqual((archived.status, archived.subtotal, archived.item_count), ('PAID', Decimal('20.00'), 1))
+        item = archived.items.get()
+        self.assertEqual((item.product_id, item.product_name, item.quantity), (product.pk, 'Shirt', 2))
+
+        # The history outlives the product
+        product.delete()
+        self.assertEqual(ArchivedCartItem.objects.get().product_name, 'Shirt')
+
+        # Running again finds nothing left
+        output = self.cleanup()
+        self.assertIn('0 abandoned carts deleted', output)
+        self.assertIn('0 historical carts archived', output)
+
+    def test_item_writes_keep_a_cart_alive(self):
+        cart = self.make_old_cart(40, 'PENDING')
+        self.client.force_authenticate(user=cart.user)
+        self.client.post(reverse('item-list', args=[cart.pk]), {'product': self.make_product().pk, 'quantity': 1})
+        self.cleanup()
+        self.assertTrue(Cart.objects.filter(pk=cart.pk).exists())
+
+    def test_delete_history_and_cached_state(self):
+        paid = self.make_old_cart(400, 'PAID', [(self.make_product(), 1)])
+        pending = self.make_old_cart(40, 'PENDING')
+        set_pending_cart_id(pending.user_id, pending.pk)
+        get_cart_version(paid.pk)
+
+        self.cleanup('--delete-history')
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(ArchivedCart.objects.exists())
+        self.assertIsNone(get_pending_cart_id(pending.user_id))
+        self.assertIsNone(cache.get(cart_version_key(paid.pk)))
+
+
+class CatalogCacheTests(CommerceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        catalog_cache.reset_stats()
+        self.client.force_authenticate(user=None)
+
+    def test_repeated_reads_are_served_from_cache(self):
+        self.make_product()
+        url = reverse('product-list')
+
+        first = self.client.get(url, {'search': 'shirt'})
+        with self.assertNumQueries(0):
+            second = self.client.get(url, {'search': 'shirt'})
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(catalog_cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_keys_include_category_search_and_page(self):
+        self.make_product()
+        self.client.get(reverse('product-category-list', args=['cl']))
+        self.client.get(reverse('product-category-list', args=['fw']))
+        self.client.get(reverse('product-list'), {'page': 1})
+        self.client.get(reverse('product-list'), {'search': 'x'})
+        self.assertEqual(catalog_cache.stats(), {'hits': 0, 'misses': 4})
+
+    def test_product_changes_invalidate_cache(self):
+        product = self.make_product()
+        detail = reverse('product-detail', args=[product.pk])
+        self.client.get(detail)
+
+        # The version is bumped once the change is committed
+        product.price = Decimal('99.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        response = self.client.get(detail)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['price'], '99.00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(self.client.get(detail).status_code, 404)
+
+
+class CategoryFacetsTests(CommerceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_authenticate(user=None)
+        for number in range(7):
+            self.make_product(name=f'Shirt {number}', in_stock=number % 3 != 0)
+        self.make_product(name='Boots', category='FW')
+
+    def test_facets_list_every_category(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('category-facets'))
+        self.assertEqual(response.data['count'], 8)
+        self.assertEqual(response.data['in_stock'], 5)
+        categories = {facet['code']: facet for facet in response.data['categories']}
+        self.assertEqual(list(categories), [code for code, _ in Product.CATEGORY_CHOICES])
+        self.assertEqual(categories['CL'], {'code': 'CL', 'name': 'Clothes', 'count': 7, 'in_stock': 4})
+        self.assertEqual(categories['GA']['count'], 0)
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse('category-facets'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_product(name='Watch', category='GA')
+        response = self.client.get(reverse('category-facets'))
+        self.assertEqual(response.data['count'], 9)
+
+    def test_pages_reuse_the_counts(self):
+        url = reverse('product-category-list', args=['cl'])
+        self.client.get(reverse('category-facets'))
+        # Only the page rows, no COUNT(*)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'page': 2})
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNone(response.data['next'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('product-list'), {'page': 2})
+        self.assertEqual(response.data['count'], 8)
+
+        self.assertEqual(self.client.get(reverse('product-category-list', args=['ga'])).data['count'], 0)
+
+    def test_searches_count_their_matches(self):
+        self.make_product(name='Linen shirt')
+        self.client.get(reverse('category-facets'))
+        response = self.client.get(reverse('product-category-list', args=['cl']), {'search': 'linen'})
+        self.assertEqual(response.data['count'], 1)
+
+
+class AdminChangelistTests(CommerceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        admin = User.objects.create_superuser(username='admin', password='password123@')
+        self.client.force_login(admin)
+
+    def add_rows(self, number):
+        for _ in range(number):
+            user = User.objects.create_user(username=f'user-{User.objects.count()}')
+            product = self.make_product(name=f'Shirt {Product.objects.count()}', stock=3)
+            Cart.objects.create(user=user, status='PAID')
+            cart = Cart.objects.create(user=user, status='PENDING')
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+
+    def changelist_queries(self, model, data=None):
+        url = reverse(f'admin:commerce_{model}_changelist')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in ctx.captured_queries]
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        pages = [('product', None), ('product', {'category__exact': 'CL', 'in_stock__exact': '1'}),
+                 ('cart', None), ('cart', {'status__exact': 'PENDING'}), ('cartitem', None)]
+        self.add_rows(2)
+        baseline = [len(self.changelist_queries(model, data)) for model, data in pages]
+        self.add_rows(5)
+        self.assertEqual([len(self.changelist_queries(model, data)) for model, data in pages], baseline)
+
+    def test_filters_and_autocomplete(self):
+        self.add_rows(3)
+        response = self.client.get(reverse('admin:commerce_cart_changelist'), {'status__exact': 'PENDING'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'commerce', 'model_name': 'cartitem', 'field_name': 'product', 'term': 'Shirt',
+        })
+        self.assertEqual(len(response.json()['results']), 3)
+
+    def test_bulk_deletes_update_the_carts(self):
+        self.add_rows(2)
+        cart = Cart.objects.filter(status='PENDING').order_by('pk').first()
+        version = get_cart_version(cart.pk)
+        url = reverse('admin:commerce_cartitem_changelist')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {
+                'action': 'delete_selected', 'post': 'yes', '_selected_action': list(cart.items.values_list('pk', flat=True)),
+            })
+        self.assertEqual(response.status_code, 302)
+        cart.refresh_from_db()
+        self.assertEqual((cart.subtotal, cart.item_count), (0, 0))
+        self.assertNotEqual(get_cart_version(cart.pk), version)
+        self.assertEqual(Cart.objects.exclude(pk=cart.pk).filter(status='PENDING', item_count=1).count(), 1)
+
+        set_pending_cart_id(cart.user_id, cart.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:commerce_cart_changelist'), {
+                'action': 'delete_selected', 'post': 'yes', '_selected_action': [cart.pk],
+            })
+        self.assertFalse(Cart.objects.filter(pk=cart.pk).exists())
+        self.assertIsNone(get_pending_cart_id(cart.user_id))
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=0)
+    def test_large_tables_are_not_counted(self):
+        self.add_rows(2)
+        queries = self.changelist_queries('cartitem')
+        if connection.vendor == 'postgresql':
+            self.assertFalse([sql for sql in queries if 'COUNT(' in sql.upper()])
+            self.assertTrue([sql for sql in queries if sql.startswith('EXPLAIN')])
+        else:
+            # Only PostgreSQL has an estimate, the others count
+            self.assertTrue([sql for sql in queries if 'COUNT(' in sql.upper()])
+
+
+class CursorPaginationTests(CommerceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def collect_cursor_pages(self, url):
+        names, pages = [], 0
+        response = self.client.get(url, {'pagination': 'cursor'})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            names.extend(item.get('name', item.get('product_name')) for item in response.data['results'])
+            pages += 1
+            if not response.data['next']:
+                return names, pages
+            response = self.client.get(response.data['next'])
+
+    def test_product_list_defaults_to_page_numbers(self):
+        self.make_product()
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.data['count'], 1)
+
+    def test_cursor_pages_cover_every_product_once(self):
+        for number in range(12):
+            self.make_product(name=f'Product {number}')
+
+        names, pages = self.collect_cursor_pages(reverse('product-list'))
+        self.assertEqual(pages, 3)
+        self.assertEqual(names, [f'Product {number}' for number in reversed(range(12))])
+
+        names, _ = self.collect_cursor_pages(reverse('product-category-list', args=['CL']))
+        self.assertEqual(len(names), 12)
+
+    def test_cursor_pages_for_cart_items(self):
+        products = [self.make_product(name=f'Product {number}') for number in range(15)]
+        cart = self.make_cart(status='PENDING', items=[(product, 1) for product in products])
+
+        names, pages = self.collect_cursor_pages(reverse('item-list', args=[cart.pk]))
+        self.assertEqual(pages, 2)
+        self.assertEqual(names, [product.name for product in products])
+
+
+class ProductSearchTests(CommerceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        search_index.clear()
+        self.shirt = self.make_product(name='Linen shirt', description='Light summer wear')
+        self.boots = self.make_product(name='Hiking boots', description='Pairs well with a flannel shirt', category='FW')
+        self.watch = self.make_product(name='Smart watch', category='GA')
+
+    def search(self, text, url=None):
+        response = self.client.get(url or reverse('product-list'), {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.data['results']]
+
+    def test_matches_name_and_description_ranked(self):
+        self.assertEqual(self.search('shirt'), ['Linen shirt', 'Hiking boots'])
+
+    def test_matches_prefixes_of_every_term(self):
+        self.assertEqual(self.search('sma wat'), ['Smart watch'])
+        self.assertEqual(self.search('hik shirt'), ['Hiking boots'])
+        self.assertEqual(self.search('shirt watch'), [])
+
+    def test_category_search_and_index_updates(self):
+        url = reverse('product-category-list', args=['fw'])
+        self.assertEqual(self.search('shirt', url), ['Hiking boots'])
+
+        self.boots.name = 'Trail runners'
+        self.boots.save()
+        self.assertEqual(self.search('trail', url), ['Trail runners'])
+        self.assertEqual(self.search('hiking', url), [])
+
+    def test_cursor_pages_are_not_available_for_ranked_results(self):
+        response = self.client.get(reverse('product-list'), {'search': 'shirt', 'pagination': 'cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pagination', response.data)
+        response = self.client.get(reverse('product-list'), {'search': ' ', 'pagination': 'cursor'})
+        self.assertEqual(response.status_code, 200)
+
+    @patch('commerce.search.FALLBACK_MAX_RESULTS', 1)
+    def test_fallback_search_returns_the_best_matches_only(self):
+        if use_postgres_search():
+            self.skipTest('PostgreSQL ranks in the database')
+        self.assertEqual(self.search('shirt'), ['Linen shirt'])
+
+    def test_rebuild_command(self):
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('3 products', out.getvalue())
+
+
+class ProductImportExportTests(CommerceTestCase):
+
+    def write_file(self, suffix, content):
+        handle = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8')
+        with handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+    def test_csv_import_creates_updates_and_skips_invalid_rows(self):
+        existing = self.make_product(name='Old name')
+        path = self.write_file('.csv', (
+            'id,name,description,price,category,in_stock\n'
+            f'{existing.pk},New name,,12.00,CL,False\n'
+            ',Cap,,5.00,AC,True\n'
+            ',Broken,,not-a-price,AC,True\n'
+            ',Sandals,,20.00,FW,True\n'
+        ))
+        out, err = StringIO(), StringIO()
+        call_command('import_products', path, '--batch-size', '2', stdout=out, stderr=err)
+
+        self.assertIn('2 created, 1 updated, 1 skipped', out.getvalue())
+        self.assertIn('Row 3 skipped', err.getvalue())
+        existing.refresh_from_db()
+        self.assertEqual((existing.name, existing.in_stock), ('New name', False))
+        self.assertEqual(set(Product.objects.values_list('name', flat=True)), {'New name', 'Cap', 'Sandals'})
+
+    def test_csv_round_trip_keeps_untracked_stock(self):
+        self.make_product(name='Shirt', description='Cotton, "classic"')
+        self.make_product(name='Watch', price='150.00', category='GA', stock=7)
+        export_path = self.write_file('.csv', '')
+        call_command('export_products', export_path, stdout=StringIO())
+
+        Product.objects.all().delete()
+        out, err = StringIO(), StringIO()
+        call_command('import_products', export_path, stdout=out, stderr=err)
+        self.assertIn('2 created, 0 updated, 0 skipped', out.getvalue())
+        self.assertEqual(err.getvalue(), '')
+        self.assertEqual(
+            list(Product.objects.order_by('name').values_list('name', 'description', 'stock', 'in_stock')),
+            [('Shirt', 'Cotton, "classic"', None, True), ('Watch', '', 7, True)],
+        )
+
+    def test_jsonl_round_trip(self):
+        self.make_product(name='Shirt', description='Cotton "classic"')
+        self.make_product(name='Watch', price='150.00', category='GA', stock=7)
+        export_path = self.write_file('.jsonl', '')
+        call_command('export_products', export_path, stdout=StringIO())
+
+        with open(export_path, encoding='utf-8') as handle:
+            records = [json.loads(line) for line in handle]
+        self.assertEqual([record['name'] for record in records], ['Shirt', 'Watch'])
+        self.assertEqual(records[1]['price'], '150.00')
+
+        Product.objects.all().delete()
+        out = StringIO()
+        call_command('import_products', export_path, stdout=out)
+        # The exported ids no longer exist, so the rows are created again
+        self.assertIn('2 created, 0 updated', out.getvalue())
+        self.assertEqual(
+            list(Product.objects.order_by('name').values_list('name', 'description', 'price', 'stock')),
+            [('Shirt', 'Cotton "classic"', Decimal('10.00'), None), ('Watch', '', Decimal('150.00'), 7)],
+        )
+
+
+class CartItemBulkTests(CommerceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.products = [self.make_product(name=f'Product {number}') for number in range(30)]
+        self.cart = self.make_cart(status='PENDING', items=[(self.products[0], 5), (self.products[1], 1)])
+        self.url = reverse('item-bulk', args=[self.cart.pk])
+
+    def test_applies_every_operation_in_a_fixed_number_of_queries(self):
+        operations = [{'product': product.pk, 'quantity': 2} for product in self.products[2:]]
+        operations += [{'product': self.products[0].pk, 'quantity': 3}, {'product': self.products[1].pk, 'quantity': 0}]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, operations, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertLess(len(ctx.captured_queries), 13)
+
+        quantities = dict(self.cart.items.values_list('product_id', 'quantity'))
+        self.assertEqual(len(quantities), 29)
+        self.assertEqual(quantities[self.products[0].pk], 3)
+        self.assertNotIn(self.products[1].pk, quantities)
+        self.assertEqual(response.data['items_count'], 29)
+        self.assertEqual(response.data['total_price'], Decimal('590.00'))
+
+    def test_rejects_unknown_products_without_changes(self):
+        response = self.client.post(self.url, [
+            {'product': self.products[2].pk, 'quantity': 1},
+            {'product': 999999, 'quantity': 1},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.cart.items.count(), 2)
+
+    def test_rejects_non_pending_and_foreign_carts(self):
+        paid = self.make_cart(status='PAID')
+        response = self.client.post(reverse('item-bulk', args=[paid.pk]), [{'product': self.products[0].pk, 'quantity': 1}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+        other = User.objects.create_user(username='other', password='password123@')
+        self.client.force_authenticate(user=other)
+        response = self.client.post(self.url, [{'product': self.products[0].pk, 'quantity': 1}], format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+class PendingCartTests(CommerceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.url = reverse('pending-cart')
+
+    def test_cached_lookup_serves_the_cart_in_fixed_queries(self):
+        first = self.client.get(self.url)
+        cart = Cart.objects.get(user=self.user, status='PENDING')
+        self.assertEqual(first.data['id'], cart.pk)
+
+        products = [self.make_product(name=f'Product {number}') for number in range(5)]
+        for product in products:
+            CartItem.objects.create(cart=cart, product=product)
+
+        # ETag validators, cart with totals, its items and their products
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['items_count'], 5)
+
+    def test_status_change_and_delete_invalidate_the_cached_id(self):
+        paid_id = self.client.get(self.url).data['id']
+        cart = Cart.objects.get(pk=paid_id)
+        cart.status = 'PAID'
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.save()
+
+        new_id = self.client.get(self.url).data['id']
+        self.assertNotEqual(new_id, paid_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('cart-detail', args=[new_id]))
+        self.assertNotIn(self.client.get(self.url).data['id'], (paid_id, new_id))
+
+    def test_stale_cached_id_falls_back_to_the_database(self):
+        old_id = self.client.get(self.url).data['id']
+        # Bulk updates bypass the signals
+        Cart.objects.filter(pk=old_id).update(status='CANCELLED')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['id'], old_id)
+        self.assertEqual(Cart.objects.filter(user=self.user, status='PENDING').count(), 1)
+
+
+# SQLite's shared in-memory test database fails concurrent writers instead of queueing them
+@skipUnlessDBFeature('has_select_for_update')
+class CartItemConcurrencyTests(TransactionTestCase):
+
+    def test_parallel_adds_keep_an_exact_quantity(self):
+        user = User.objects.create_user(username='jude', password='password123@')
+        product = Product.objects.create(name='Shirt', price=Decimal('10.00'), category='CL')
+        cart = Cart.objects.create(user=user, status='PENDING')
+        url = reverse('item-list', args=[cart.pk])
+        threads, adds_per_thread = 8, 5
+        # Every thread also adds a product of its own, the stored totals must see all of them
+        own_products = [
+            Product.objects.create(name=f'Cap {number}', price=Decimal('1.00'), category='AC') for number in range(threads)
+        ]
+        statuses = []
+        barrier = threading.Barrier(threads)
+
+        def add_items(own_product):
+            client = APIClient()
+            client.force_authenticate(user=user)
+            try:
+                barrier.wait()
+                for _ in range(adds_per_thread):
+                    statuses.append(client.post(url, {'product': product.pk, 'quantity': 1}).status_code)
+                    statuses.append(client.post(url, {'product': own_product.pk, 'quantity': 1}).status_code)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=add_items, args=(own_product,)) for own_product in own_products]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(statuses, [201] * threads * adds_per_thread * 2)
+        item = CartItem.objects.get(cart=cart, product=product)
+        self.assertEqual(item.quantity, threads * adds_per_thread)
+
+        cart.refresh_from_db()
+        self.assertEqual(cart.item_count, threads + 1)
+        self.assertEqual(cart.subtotal, Decimal('10.00') * threads * adds_per_thread + Decimal('1.00') * threads * adds_per_thread)
+
+
+class RequestMetricsTests(CommerceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_server_timing_header(self):
+        self.make_product()
+        response = self.client.get(reverse('product-list'))
+        timings = dict(part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+        self.assertEqual(set(timings), {'db', 'view', 'render', 'total'})
+        self.assertIn('desc="2 queries"', timings['db'])
+
+    async def test_server_timing_header_under_asgi(self):
+        await Product.objects.acreate(name='Shirt', price=Decimal('10.00'), category='CL')
+        response = await self.async_client.get(reverse('product-list'))
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+    def test_log_records_connection_use(self):
+        with self.assertLogs('shoplift.requests', 'INFO') as logs:
+            self.client.get(reverse('pending-cart'))
+        record = json.loads(logs.records[0].getMessage())
+        # The connection opened for the test case is reused, no pool is configured
+        self.assertEqual(record['connections'], 0)
+        self.assertNotIn('pool', record)
+
+    def test_pool_stats_describe_the_default_pool(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Connection pools need PostgreSQL')
+        with patch.dict(connection.settings_dict, CONN_MAX_AGE=0), \
+                patch.dict(connection.settings_dict['OPTIONS'], pool={'min_size': 1, 'max_size': 2}):
+            try:
+                connection.pool.open(wait=True)
+                self.assertEqual(pool_stats(), {'size': 1, 'available': 1, 'waiting': 0})
+            finally:
+                connection.close_pool()
+
+    def test_exceeding_a_query_budget_fails(self):
+        self.make_product()
+        with self.settings(QUERY_BUDGETS={'product-list': 1}):
+            with self.assertRaises(QueryBudgetExceeded), self.assertLogs('shoplift.requests', 'WARNING'):
+                self.client.get(reverse('product-list'))
+
+            with self.settings(QUERY_BUDGET_STRICT=False), self.assertLogs('shoplift.requests', 'WARNING') as logs:
+                self.client.get(reverse('product-list'), {'search': 'shirt'})
+        self.assertEqual(json.loads(logs.records[0].getMessage())['query_budget'], 1)
+
+
+class BenchmarkHarnessTests(CommerceTestCase):
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_benchmark_covers_every_route(self):
+        output = self.write_output()
+        call_command(
+            'benchmark_api', '--in-place', '--products', '20', '--users', '2',
+            '--iterations', '2', '--warmup', '0', '--output', output,
+            stdout=StringIO(), stderr=StringIO(),
+        )
+        with open(output, encoding='utf-8') as handle:
+            report = json.load(handle)
+
+        routes = {name.split(':')[0] for name in report['results']}
+        url_names = {
+            pattern.name
+            for module in (commerce_urls, account_urls)
+            for pattern in module.urlpatterns
+        }
+        self.assertEqual(routes, url_names)
+        for result in report['results'].values():
+            self.assertEqual(result['unexpected_statuses'], {})
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+    def write_output(self):
+        handle = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        handle.close()
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+
+class FastSerializationTests(CommerceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.shirt = self.make_product(name='Ünïcode shirt\u2028\u2029', description='Line\nbreak "quoted"', price='10.50')
+        for number in range(5):
+            self.make_product(name=f'Filler {number}', price=f'{number}.00', category='EX')
+        self.make_product(name='Boots', price='99.99', category='FW', in_stock=False)
+        self.make_product(name='Cap', price='0.10', category='AC')
+        self.make_cart(status='PAID', items=[(self.shirt, 3)])
+        self.make_cart(status='CANCELLED')
+
+    def both_paths(self, view_class, url, params=None, status=200):
+        responses = []
+        for fast in (False, True):
+            cache.clear()
+            with patch.object(view_class, 'fast_serialization', fast):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status)
+            responses.append(response.content)
+        return responses
+
+    def test_fast_path_is_byte_identical(self):
+        cases = [
+            (views.ProductAV, reverse('product-list'), None),
+            (views.ProductAV, reverse('product-list'), {'page': 2}),
+            (views.ProductAV, reverse('product-list'), {'pagination': 'cursor'}),
+            (views.ProductAV, reverse('product-list'), {'search': 'shirt'}),
+            (views.ProductCategoryAV, reverse('product-category-list', args=['fw']), None),
+            (views.ProductAVDetail, reverse('product-detail', args=[self.shirt.pk]), None),
+            (views.CartAV, reverse('cart-list'), None),
+            (views.CartAV, reverse('cart-list'), {'status': 'PAID'}),
+        ]
+        for view_class, url, params in cases:
+            with self.subTest(url=url, params=params):
+                slow, fast = self.both_paths(view_class, url, params)
+                self.assertEqual(slow, fast)
+
+    def test_fast_path_detail_not_found(self):
+        slow, fast = self.both_paths(views.ProductAVDetail, reverse('product-detail', args=[0]), status=404)
+        self.assertEqual(slow, fast)
+        self.assertEqual(json.loads(fast), {'detail': 'No Product matches the given query.'})
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            'text': 'café\u2028\u2029 "q"',
+            'numbers': [1, 2.5, Decimal('3.10'), None, True],
+            'nested': [{'a': {'b': []}}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=4'),
+            JSONRenderer().render(data, 'application/json; indent=4'),
+        )
+
+
+class ConditionalGetTests(CommerceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.product = self.make_product()
+        self.cart = self.make_cart(status='PENDING', items=[(self.product, 1)])
+
+    def revalidate(self, url, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, **headers)
+        return response, len(ctx.captured_queries)
+
+    def test_product_endpoints_return_304_without_queries(self):
+        urls = [
+            reverse('product-list'),
+            reverse('product-list') + '?page=1',
+            reverse('product-category-list', args=['cl']),
+            reverse('product-detail', args=[self.product.pk]),
+        ]
+        etags = set()
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(first.status_code, 200)
+                etags.add(first['ETag'])
+
+                response, queries = self.revalidate(url, HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(queries, 0)
+                self.assertEqual(response.content, b'')
+        self.assertEqual(len(etags), len(urls))
+
+    def test_product_change_invalidates_validators(self):
+        url = reverse('product-detail', args=[self.product.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        first = self.client.get(url)
+
+        response, _ = self.revalidate(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_product(name='Another')
+        response, _ = self.revalidate(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_cart_endpoints_return_304_until_the_cart_changes(self):
+        for url in (reverse('cart-detail', args=[self.cart.pk]), reverse('pending-cart')):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertIn('private', first['Cache-Control'])
+
+                response, queries = self.revalidate(url, HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(response.status_code, 304)
+                # The pending cart needs its id first
+                self.assertLessEqual(queries, 1)
+
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post(reverse('item-list', args=[self.cart.pk]), {'product': self.product.pk})
+                response, _ = self.revalidate(url, HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['items'][0]['quantity'], self.cart.items.get().quantity)
+
+    def test_cart_validators_do_not_trust_the_cache(self):
+        url = reverse('cart-detail', args=[self.cart.pk])
+        first = self.client.get(url)
+        # A worker whose cache missed the write, only the row changed
+        Cart.objects.filter(pk=self.cart.pk).update(subtotal=Decimal('99.00'))
+        response, _ = self.revalidate(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+        first = self.client.get(reverse('pending-cart'))
+        set_pending_cart_id(self.user.pk, self.make_cart(status='PAID').pk)
+        Cart.objects.filter(pk=self.cart.pk).update(status='CANCELLED')
+        response, _ = self.revalidate(reverse('pending-cart'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['id'], self.cart.pk)
+
+    def test_deployments_need_a_shared_cache(self):
+        self.assertEqual([error.id for error in check_catalog_cache(None)], ['commerce.E001'])
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        with self.settings(CACHES=redis):
+            self.assertEqual(check_catalog_cache(None), [])
+
+    def test_other_users_never_match(self):
+        url = reverse('cart-detail', args=[self.cart.pk])
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(user=User.objects.create_user(username='other', password='password123@'))
+        response, _ = self.revalidate(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class CheckoutConcurrencyTests(TransactionTestCase):
+
+    def test_concurrent_checkouts_never_oversell(self):
+        products = [
+            Product.objects.create(name=f'Hot {number}', price=Decimal('10.00'), category='GA', stock=10)
+            for number in range(3)
+        ]
+        carts = []
+        for number in range(12):
+            user = User.objects.create_user(username=f'user-{number}')
+            cart = Cart.objects.create(user=user, status='PENDING')
+            # Opposite product orders, locking them as listed would deadlock
+            for product in (products if number % 2 else products[::-1]):
+                CartItem.objects.create(cart=cart, product=product, quantity=2)
+            carts.append(cart)
+
+        barrier = threading.Barrier(len(carts))
+        statuses = []
+
+        def checkout(cart):
+            client = APIClient()
+            client.force_authenticate(user=cart.user)
+            try:
+                barrier.wait()
+                statuses.append(client.post(reverse('checkout', args=[cart.pk])).status_code)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=checkout, args=(cart,)) for cart in carts]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        # 10 units of each product cover five carts of two
+        self.assertEqual(sorted(statuses), [200] * 5 + [400] * 7)
+        self.assertEqual(set(Product.objects.values_list('stock', 'in_stock')), {(0, False)})
+        self.assertEqual(Cart.objects.filter(status='PAID').count(), 5)
+
+    def test_checkout_benchmark_keeps_the_stock_consistent(self):
+        result = run_checkout_benchmark(checkouts=20, concurrency=4, skus=2, stock=10)
+        self.assertEqual(result['checkouts'], 20)
+        self.assertEqual(result['errors'], {})
+        self.assertTrue(result['consistent'])
+        self.assertEqual(result['paid'] + result['rejected'], 20)
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class CartCleanupConcurrencyTests(TransactionTestCase):
+
+    def test_carts_locked_by_a_request_are_skipped(self):
+        old = timezone.now() - timedelta(days=40)
+        carts = [Cart.objects.create(user=User.objects.create_user(username=f'user-{number}')) for number in range(3)]
+        Cart.objects.update(updated=old)
+        locked, released = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    Cart.objects.filter(pk=carts[1].pk).lock()
+                    locked.set()
+                    released.wait(10)
+            finally:
+                connection.close()
+
+        worker = threading.Thread(target=hold_lock)
+        worker.start()
+        try:
+            locked.wait(10)
+            out = StringIO()
+            call_command('cleanup_carts', '--batch-size', '1', stdout=out)
+        finally:
+            released.set()
+            worker.join()
+
+        self.assertIn('2 abandoned carts deleted', out.getvalue())
+        self.assertEqual(list(Cart.objects.values_list('pk', flat=True)), [carts[1].pk])
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class PendingCartConcurrencyTests(TransactionTestCase):
+
+    def test_concurrent_first_requests_share_one_cart(self):
+        cache.clear()
+        user = User.objects.create_user(username='jude', password='password123@')
+        threads = 8
+        barrier = threading.Barrier(threads)
+        results = []
+
+        def fetch_pending_cart():
+            client = APIClient()
+            client.force_authenticate(user=user)
+            try:
+                barrier.wait()
+                response = client.get(reverse('pending-cart'))
+                results.append((response.status_code, response.data.get('id')))
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=fetch_pending_cart) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual({status for status, _ in results}, {200})
+        self.assertEqual(len({cart_id for _, cart_id in results}), 1)
+        self.assertEqual(Cart.objects.filter(user=user, status='PENDING').count(), 1)
+
+
+class CartItemDetailTests(CommerceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.product = self.make_product()
+        self.cart = self.make_cart(status='PENDING', items=[(self.product, 2)])
+        self.item = self.cart.items.get()
+        self.url = reverse('item-list-detail', args=[self.item.pk])
+
+    def test_item_is_found_by_its_own_pk(self):
+        # Push the item id away from the cart id
+        for _ in range(3):
+            CartItem.objects.create(cart=self.make_cart(), product=self.make_product())
+        item = CartItem.objects.create(cart=self.cart, product=self.make_product())
+        self.assertNotEqual(item.pk, item.cart_id)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('item-list-detail', args=[item.pk]))
+        self.assertEqual(response.data['id'], item.pk)
+
+    def test_other_users_cannot_see_or_delete_items(self):
+        self.client.force_authenticate(user=User.objects.create_user(username='other', password='password123@'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.delete(self.url).status_code, 404)
+
+    def test_items_of_non_pending_carts_cannot_be_deleted(self):
+        Cart.objects.filter(pk=self.cart.pk).update(status='PAID')
+        self.assertEqual(self.client.delete(self.url).status_code, 400)
+
+
+class AsyncCatalogViewTests(CommerceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        search_index.clear()
+        for number in range(12):
+            self.make_product(name=f'Linen shirt {number}', category='CL' if number % 2 else 'FW')
+        self.product = Product.objects.first()
+
+    def async_get(self, view_class, path, data=None, **kwargs):
+        request = AsyncRequestFactory().get(path, data)
+        return async_to_sync(view_class.as_view())(request, **kwargs)
+
+    def assertSameResponse(self, view_class, path, data=None, **kwargs):
+        expected = self.client.get(path, data)
+        # Drop the cached page but keep the catalog version the ETag depends on
+        version = catalog_cache.get_version()
+        cache.clear()
+        cache.set('catalog:version', version, None)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.async_get(view_class, path, data, **kwargs)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        for header in ('ETag', 'Allow', 'Vary', 'Cache-Control'):
+            self.assertEqual(response.get(header), expected.get(header), header)
+        return response, len(ctx.captured_queries)
+
+    def test_list_pages_match_the_sync_views(self):
+        path = reverse('product-list')
+        for data in ({}, {'page': 2}, {'page': 3}, {'page': 'last'}, {'page': 9}, {'page': 'x'}, {'search': 'lin'}):
+            with self.subTest(data=data):
+                response, queries = self.assertSameResponse(async_views.AsyncProductAV, path, data)
+                if response.status_code == 200:
+                    self.assertEqual(response['X-Cache'], 'MISS')
+                    self.assertEqual(queries, 2)
+
+        path = reverse('product-category-list', args=['cl'])
+        self.assertSameResponse(async_views.AsyncProductCategoryAV, path, {'page': 2}, categoryname='cl')
+
+    def test_detail_matches_the_sync_view(self):
+        response, queries = self.assertSameResponse(
+            async_views.AsyncProductAVDetail, reverse('product-detail', args=[self.product.pk]), pk=self.product.pk,
+        )
+        self.assertEqual(queries, 1)
+        self.assertSameResponse(async_views.AsyncProductAVDetail, reverse('product-detail', args=[0]), pk=0)
+
+    def test_cache_and_validators_are_shared_with_the_sync_views(self):
+        path = reverse('product-list')
+        expected = self.client.get(path)
+
+        with self.assertNumQueries(0):
+            response = self.async_get(async_views.AsyncProductAV, path)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        request = AsyncRequestFactory().get(path, headers={'If-None-Match': expected['ETag']})
+        self.assertEqual(async_to_sync(async_views.AsyncProductAV.as_view())(request).status_code, 304)
+
+    def test_cache_is_not_read_synchronously_on_the_event_loop(self):
+        path = reverse('product-list')
+        backend = type(caches['default'])
+
+        def outside_the_loop(method):
+            def call(*args, **kwargs):
+                with self.assertRaises(RuntimeError, msg='Synchronous cache call on the event loop'):
+                    asyncio.get_running_loop()
+                return method(*args, **kwargs)
+            return call
+
+        with patch.object(backend, 'get', outside_the_loop(backend.get)), \
+                patch.object(backend, 'set', outside_the_loop(backend.set)), \
+                patch.object(backend, 'add', outside_the_loop(backend.add)):
+            miss = self.async_get(async_views.AsyncProductAV, path, {'page': 2})
+            hit = self.async_get(async_views.AsyncProductAV, path, {'page': 2})
+        self.assertEqual((miss['X-Cache'], hit['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(miss.content, self.client.get(path, {'page': 2}).content)
+
+    def test_views_need_a_drf_view_and_get_data(self):
+        class NoData(async_views.AsyncCatalogView):
+            sync_view_class = views.ProductAV
+
+        for view_class in (async_views.AsyncCatalogView, async_views.AsyncCatalogListView, NoData):
+            with self.subTest(view_class=view_class), self.assertRaises(ImproperlyConfigured):
+                view_class.as_view()
+
+    def test_other_requests_go_to_the_drf_views(self):
+        path = reverse('product-list')
+        response = self.async_get(async_views.AsyncProductAV, path, {'pagination': 'cursor'}).render()
+        self.assertEqual(len(json.loads(response.content)['results']), 5)
+        self.assertIn('cursor=', json.loads(response.content)['next'])
+
+        request = AsyncRequestFactory().post(path, {'name': 'Cap', 'price': '5.00', 'category': 'AC'})
+        self.assertEqual(async_to_sync(async_views.AsyncProductAV.as_view())(request).status_code, 401)
+
+
+class SchemaTests(CommerceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        PrecomputedSchemaView.clear()
+        self.addCleanup(PrecomputedSchemaView.clear)
+
+    def test_schema_is_generated_once_and_revalidated(self):
+        with patch.object(SchemaGenerator, 'get_schema', autospec=True, side_effect=SchemaGenerator.get_schema) as get:
+            first = self.client.get(reverse('schema'))
+            second = self.client.get(reverse('schema'))
+            self.assertEqual(get.call_count, 1)
+            as_json = self.client.get(reverse('schema'), {'format': 'json'})
+            self.assertEqual(get.call_count, 1)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertIn('max-age=3600', first['Cache-Control'])
+        self.assertIn('/api/products/', json.loads(as_json.content)['paths'])
+        self.assertNotEqual(as_json['ETag'], first['ETag'])
+
+        response = self.client.get(reverse('schema'), headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('max-age=3600', response['Cache-Control'])
+
+    def test_file_mode_serves_the_deployed_schema(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.yml', delete=False) as handle:
+            handle.write('openapi: 3.0.3\ninfo:\n  title: Deployed\n  version: 1.0.0\npaths: {}\n')
+        self.addCleanup(os.remove, handle.name)
+
+        with self.settings(SCHEMA_MODE='file', SCHEMA_FILE=handle.name), \
+                patch.object(SchemaGenerator, 'get_schema') as get:
+            response = self.client.get(reverse('schema'), {'format': 'json'})
+        get.assert_not_called()
+        self.assertEqual(json.loads(response.content)['info']['title'], 'Deployed')
+
+    def test_committed_schema_is_up_to_date(self):
+        # Integer bounds come from the database backend
+        if connection.vendor != 'postgresql':
+            self.skipTest('schema.yml is generated against PostgreSQL')
+        with open(os.path.join(os.path.dirname(__file__), '..', 'schema.yml'), encoding='utf-8') as handle:
+            committed = handle.read()
+        generated = OpenApiYamlRenderer().render(SchemaGenerator().get_schema(request=None, public=True))
+        self.assertEqual(committed, generated.decode(), 'Run python manage.py spectacular --file schema.yml')
+
+    def test_async_views_are_documented_as_their_drf_views(self):
+        generator = SchemaGenerator(patterns=[
+            path('products/', async_views.AsyncProductAV.as_view()),
+            path('register/', AsyncRegister),
+        ])
+        schema = generator.get_schema(request=None, public=True)
+        self.assertEqual(set(schema['paths']['/products/']), {'get', 'post'})
+        self.assertIn('post', schema['paths']['/register/'])
+
+    def test_profile_startup_reports_every_package(self):
+        out = StringIO()
+        call_command('profile_startup', '--runs', '1', stdout=out)
+        for name in ('commerce', 'account', 'drf_spectacular', 'rest_framework_simplejwt', 'first_request_ms'):
+            self.assertIn(name, out.getvalue())
+        self.assertIn('200', out.getvalue().splitlines()[-1])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], READ_YOUR_WRITES_SECONDS=10)
+class DatabaseRoutingTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+        self.user = User(pk=7, username='jude')
+
+    # Serves a request through the middleware, view runs inside it and returns the response
+    def serve(self, method='get', user=None, view=None, view_class=None):
+        request = getattr(RequestFactory(), method)('/')
+
+        def get_response(request):
+            if view_class is not None:
+                middleware.process_view(request, view_class.as_view(), (), {})
+            if user is not None:
+                # What DRF does once it authenticated the request
+                request.user = user
+            return view(request)
+
+        middleware = DatabaseRoutingMiddleware(get_response)
+        return middleware(request)
+
+    def reads(self, request):
+        return self.router.db_for_read(Product)
+
+    def test_safe_reads_go_to_a_replica(self):
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+        self.assertEqual(self.serve(view=self.reads), 'replica1')
+        self.assertEqual(self.serve(user=self.user, view=self.reads), 'replica1')
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.serve(view=self.reads), 'default')
+
+    def test_writes_and_unsafe_methods_use_the_primary(self):
+        def write_then_read(request):
+            self.assertEqual(self.router.db_for_read(Cart), 'replica1')
+            self.assertEqual(self.router.db_for_write(Cart), 'default')
+            return self.router.db_for_read(Cart)
+
+        self.assertEqual(self.serve(view=write_then_read), 'default')
+        self.assertEqual(self.serve('post', view=self.reads), 'default')
+        self.assertEqual(self.serve(view=self.reads, view_class=views.PendingCartAV), 'default')
+
+    def test_catalog_cache_fills_read_from_the_primary_right_after_a_change(self):
+        def fill(changed_at):
+            def view(request):
+                views.ProductAV().route_cache_fill(changed_at)
+                return self.reads(request)
+            return view
+
+        self.assertEqual(self.serve(view=fill(time.time() - 2)), 'default')
+        self.assertEqual(self.serve(view=fill(time.time() - 60)), 'replica1')
+        self.assertEqual(self.serve(view=fill(None)), 'replica1')
+
+    def test_replicas_need_a_shared_cache(self):
+        self.assertEqual([error.id for error in check_replica_cache(None)], ['commerce.E002'])
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        with self.settings(CACHES=redis):
+            self.assertEqual(check_replica_cache(None), [])
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(check_replica_cache(None), [])
+
+    def test_users_read_their_writes_from_the_primary(self):
+        self.serve('post', user=self.user, view=lambda request: self.router.db_for_write(CartItem))
+        self.assertEqual(self.serve(user=self.user, view=self.reads), 'default')
+        # Other users and anonymous requests still read from the replicas
+        self.assertEqual(self.serve(user=User(pk=8), view=self.reads), 'replica1')
+        self.assertEqual(self.serve(view=self.reads), 'replica1')
+
+        cache.delete(sticky_key(self.user.pk))
+        self.assertEqual(self.serve(user=self.user, view=self.reads), 'replica1')
+
+
+# Runs when DATABASE_REPLICA_URLS configures replicas, the tests use them as mirrors of the test database
+class ReplicaRoutingTests(TransactionTestCase):
+
+    databases = '__all__'
+
+    def setUp(self):
+        if not settings.DATABASE_REPLICAS:
+            self.skipTest('No DATABASE_REPLICA_URLS configured')
+        cache.clear()
+        self.user = User.objects.create_user(username='jude')
+        self.product = Product.objects.create(name='Shirt', price=Decimal('10.00'), category='CL')
+        self.cart = Cart.objects.create(user=self.user, status='PENDING')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def queries(self, method, *args, **kwargs):
+        replica = settings.DATABASE_REPLICAS[0]
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[replica]) as replicas, \
+                patch('random.choice', return_value=replica):
+            response = getattr(self.client, method)(*args, **kwargs)
+        self.assertLess(response.status_code, 400)
+        return len(primary), len(replicas)
+
+    def test_catalog_reads_use_the_replica_once_a_change_is_old_enough(self):
+        self.client.force_authenticate(user=None)
+        products = reverse('product-list')
+        # A product change committed just now, misses read from the primary
+        cache.set(CATALOG_LAST_MODIFIED_KEY, time.time(), None)
+        primary, replicas = self.queries('get', products)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replicas, 0)
+
+        # Once the replicas had READ_YOUR_WRITES_SECONDS to catch up, they serve the misses again
+        catalog_cache.bump_version()
+        cache.set(CATALOG_LAST_MODIFIED_KEY, time.time() - settings.READ_YOUR_WRITES_SECONDS - 1, None)
+        primary, replicas = self.queries('get', products)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replicas, 0)
+
+    def test_cart_writes_and_the_users_next_reads_use_the_primary(self):
+        items = reverse('item-list', args=[self.cart.pk])
+        self.assertEqual(self.queries('get', items)[0], 0)
+
+        primary, replicas = self.queries('post', items, {'product': self.product.pk, 'quantity': 2})
+        self.assertEqual(replicas, 0)
+        primary, replicas = self.queries('get', items)
+        self.assertEqual(replicas, 0)
+        self.assertEqual(self.queries('get', reverse('pending-cart'))[1], 0)
+
+
+class QueryPlanTests(CommerceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for number in range(20):
+            self.make_product(name=f'Product {number}', category=['CL', 'AC', 'FW', 'GA'][number % 4])
+            self.make_cart(status=['PAID', 'CANCELLED'][number % 2])
+        # Paid carts of someone else, so the status alone is not as selective as the user and status
+        other = User.objects.create_user(username='ada', password='password123@')
+        Cart.objects.bulk_create(Cart(user=other, status='PAID') for _ in range(20))
+
+    def plan(self, queryset):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # The tables are tiny, make the planner show whether the index is usable at all
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('ANALYZE commerce_cart, commerce_product')
+        return queryset.explain()
+
+    def test_category_page_uses_the_category_index(self):
+        view = views.ProductCategoryAV(kwargs={'categoryname': 'cl'})
+        queryset = view.get_queryset()
+        self.assertEqual(queryset.count(), 5)
+        self.assertIn('product_category_created_idx', self.plan(queryset[:5]))
+
+    def test_cart_lookup_by_status_uses_the_cart_index(self):
+        queryset = Cart.objects.filter(user=self.user, status='PAID').order_by('-created')
+        self.assertIn('cart_user_status_created_idx', self.plan(queryset))